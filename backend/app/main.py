@@ -11,9 +11,13 @@ from app.routers import (
     rag,
     code_fix,
     search,
+    metrics,
 )
 from app.routers import debug_auth
 from app.routers import weather
+from app.services.extraction_service import shutdown_pool
+from app.services.langsearch_service import close_search_session
+from app.services.weather_service import close_weather_session
 
 
 app = FastAPI(title="Imaginarium AI API")
@@ -46,3 +50,19 @@ app.include_router(translation.router)
 app.include_router(code_fix.router)
 app.include_router(search.router)
 app.include_router(weather.router)
+app.include_router(metrics.router)
+
+
+@app.on_event("shutdown")
+def _stop_extraction_workers():
+    shutdown_pool()
+
+
+@app.on_event("shutdown")
+async def _close_search_client():
+    await close_search_session()
+
+
+@app.on_event("shutdown")
+async def _close_weather_client():
+    await close_weather_session()
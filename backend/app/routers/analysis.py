@@ -1,8 +1,10 @@
-from fastapi import APIRouter, UploadFile, File, Depends
+import asyncio
+
+from fastapi import APIRouter, UploadFile, File, Form, Depends
 from app.core.security import require_user
-from app.services.analysis_service import preview_table, bar_png
+from app.services.analysis_service import read_table, summarize_table, check_axes, bar_png
 from app.utils.file_validation import validate_file, ALLOWED_DOC_MIME
-from app.stores.uploaded_data_store import uploaded_data_store
+from app.stores.uploaded_data_store import dataset_store, QuotaError
 from io import BytesIO
 from fastapi.responses import StreamingResponse
 
@@ -11,21 +13,49 @@ router = APIRouter(prefix="/api", tags=["Analysis"])
 
 
 @router.post("/analysis/upload")
-async def upload(file: UploadFile = File(...), user=Depends(require_user)):
-    ok, msg = validate_file(file.content_type, 0, ALLOWED_DOC_MIME)
-    if not ok: return {"error": msg}
+async def upload(
+    file: UploadFile = File(...),
+    name: str | None = Form(None),
+    sheet: str | None = Form(None),
+    user=Depends(require_user),
+):
     b = await file.read()
-    preview, cols = preview_table(b, file.filename)
-    uploaded_data_store[user.sub] = {"bytes": b, "filename": file.filename, "preview": preview, "cols": cols}
-    return {"preview": preview, "columns": cols}
+    ok, msg = validate_file(file.content_type, len(b), ALLOWED_DOC_MIME)
+    if not ok: return {"error": msg}
+    try:
+        df = await asyncio.to_thread(read_table, b, file.filename, sheet if sheet else 0)
+    except ValueError as exc:
+        return {"error": str(exc)}
+    preview, cols, profile = await asyncio.to_thread(summarize_table, df)
+    ds_name = (name or file.filename or "dataset").strip()
+    meta = {"preview": preview, "cols": cols, "profile": profile}
+    try:
+        await asyncio.to_thread(dataset_store.put, user.sub, ds_name, df, file.filename, meta)
+    except QuotaError as exc:
+        return {"error": str(exc)}
+    return {"dataset": ds_name, "preview": preview, "columns": cols, "profile": profile}
+
+
+@router.get("/analysis/datasets")
+async def list_datasets(user=Depends(require_user)):
+    datasets = await asyncio.to_thread(dataset_store.list, user.sub)
+    return {"datasets": [
+        {"name": d.name, "filename": d.filename, "bytes": d.size_bytes, "columns": d.meta.get("cols", [])}
+        for d in datasets
+    ]}
+
+
+@router.delete("/analysis/datasets/{name}")
+async def delete_dataset(name: str, user=Depends(require_user)):
+    return {"ok": await asyncio.to_thread(dataset_store.delete, user.sub, name)}
 
 
 @router.get("/analysis/chart")
-async def chart(x: str, y: str, user=Depends(require_user)):
-    data = uploaded_data_store.get(user.sub)
+async def chart(x: str, y: str, dataset: str | None = None, user=Depends(require_user)):
+    data = await asyncio.to_thread(dataset_store.get, user.sub, dataset)
     if not data: return {"error":"No data uploaded"}
-    import pandas as pd, io
-    b = data["bytes"]; fn = data["filename"]
-    df = pd.read_csv(BytesIO(b)) if fn.endswith('.csv') else pd.read_excel(BytesIO(b))
-    png = bar_png(df, x, y)
+    ok, msg, bucket = check_axes(data.meta.get("profile") or {}, x, y)
+    if not ok: return {"error": msg}
+    df = await asyncio.to_thread(dataset_store.load, data, list(dict.fromkeys([x, y])))
+    png = bar_png(df, x, y, bucket=bucket)
     return StreamingResponse(BytesIO(png), media_type="image/png")
@@ -1,5 +1,8 @@
+import asyncio
 import json
 import os
+import time
+from contextlib import aclosing
 
 import requests
 from fastapi import APIRouter, HTTPException, Request
@@ -7,17 +10,17 @@ from fastapi.responses import StreamingResponse
 
 from app.services.langsearch_service import LangSearchError, langsearch
 from app.services import ollama_service as ollama
-from app.services.weather_service import (
-    WeatherError,
-    realtime as weather_realtime,
-    forecast as weather_forecast,
-    forecast_hourly as weather_hourly,
-)
+from app.utils import metrics
+from app.utils.prompt_compaction import compact_results, estimate_tokens
+from app.services.weather_service import WeatherError, fetch_weather
 
 
 router = APIRouter(prefix="/api", tags=["Chat"])
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://ollama-dev:11434")
 SEARCH_TRIGGER = "NEEDS_SEARCH"
+# Search-grounded answers: shrink the snippets to this many prompt tokens.
+CHAT_SEARCH_COMPACT = (os.getenv("CHAT_SEARCH_COMPACT", "1") or "1").strip().lower() not in ("0", "false", "no")
+CHAT_SEARCH_PROMPT_TOKENS = int(os.getenv("CHAT_SEARCH_PROMPT_TOKENS", "900") or 900)
 SYSTEM_INSTRUCTION = (
     "You are an assistant embedded in Imaginarium AI. Answer concisely using your training data. "
     "When you include code, return it as fenced Markdown code blocks with the correct language identifier (e.g., ```python, ```sql). "
@@ -123,13 +126,13 @@ async def chat_endpoint(request: Request):
                 return f"{m2.group(1)},{m2.group(2)}"
             return None
 
-        def stream_response():
+        async def stream_response():
             try:
                 # Let the UI know we're working on the answer.
                 yield _encode(model, "Thinking…")
 
                 first_prompt = f"{SYSTEM_INSTRUCTION}\n\nUser request:\n{prompt}"
-                initial = _call_model(first_prompt, model)
+                initial = await asyncio.to_thread(_call_model, first_prompt, model)
 
                 # If model signals search explicitly OR we detect it's a live query,
                 # decide whether to use the weather API or generic web search.
@@ -147,51 +150,41 @@ async def chat_endpoint(request: Request):
                         yield _encode(model, "Please specify a location (e.g., 'weather today in Boston, MA').")
                         return
                     yield _encode(model, f"Fetching live weather for {loc}…")
-                    try:
-                        current = weather_realtime(loc, weather_units)
-                    except WeatherError as exc:
-                        yield _encode(model, f"Weather service unavailable: {exc}")
-                        return
-
-                    # If geocoding resolved the input, let the user know the interpreted place.
-                    resolved_label = current.get("resolved_label")
-                    resolved_loc = current.get("resolved_location")
-                    if resolved_label or (resolved_loc and (resolved_loc != loc)):
-                        note = resolved_label or resolved_loc
-                        yield _encode(model, f"Using location: {note}")
-
-                    loc_for_forecast = resolved_loc or loc
-                    daily = []
-                    hourly = []
-                    daily_err = None
-                    hourly_err = None
-                    try:
-                        daily = weather_forecast(loc_for_forecast, weather_units)
-                    except WeatherError as exc:
-                        daily_err = str(exc)
-                    try:
-                        hourly = weather_hourly(loc_for_forecast, weather_units, hours=12)
-                    except WeatherError as exc:
-                        hourly_err = str(exc)
-
-                    if daily_err or hourly_err:
+                    # Current, daily and hourly are fetched concurrently. The card
+                    # is streamed as soon as current conditions arrive and re-sent
+                    # with each forecast part that completes.
+                    card = {"current": None, "daily": [], "hourly": []}
+                    errors = {}
+                    async with aclosing(fetch_weather(loc, weather_units, hours=12)) as parts:
+                        async for part, value in parts:
+                            if isinstance(value, WeatherError):
+                                if part == "current":
+                                    yield _encode(model, f"Weather service unavailable: {value}")
+                                    return
+                                errors[part] = str(value)
+                                continue
+                            card[part] = value
+                            if part == "current":
+                                # If geocoding resolved the input, let the user know the interpreted place.
+                                resolved_label = value.get("resolved_label")
+                                resolved_loc = value.get("resolved_location")
+                                if resolved_label or (resolved_loc and (resolved_loc != loc)):
+                                    yield _encode(model, f"Using location: {resolved_label or resolved_loc}")
+                            if card["current"] is not None:
+                                # Stream a typed payload so the UI can render a rich weather card.
+                                yield _encode_obj({"model": model, "type": "weather", "weather": dict(card)})
+
+                    if errors:
                         msg = "Some forecast data unavailable: " + ", ".join(
-                            [p for p in [f"daily: {daily_err}" if daily_err else None, f"hourly: {hourly_err}" if hourly_err else None] if p]
+                            f"{part}: {err}" for part, err in errors.items()
                         )
                         yield _encode(model, msg)
-
-                    # Stream a typed payload so the UI can render a rich weather card.
-                    yield _encode_obj({
-                        "model": model,
-                        "type": "weather",
-                        "weather": {"current": current, "daily": daily, "hourly": hourly},
-                    })
                     return
 
                 # Need live data.
                 yield _encode(model, "Fetching live search results…")
                 try:
-                    results = langsearch(prompt, top_k=5, summary=True, freshness="now:1h")
+                    results = await langsearch(prompt, top_k=5, summary=True, freshness="now:1h")
                 except LangSearchError as exc:
                     yield _encode(model, f"Search unavailable: {exc}")
                     return
@@ -200,21 +193,9 @@ async def chat_endpoint(request: Request):
                     yield _encode(model, "No live data was found for this request.")
                     return
 
-                snippets = []
-                for idx, result in enumerate(results, start=1):
-                    snippets.append(
-                        f"{idx}. {result.get('title','')}\n{result.get('snippet','')}\n{result.get('url','')}"
-                    )
-
-                search_prompt = (
-                    "You indicated you needed real-time information. Using ONLY the verified snippets below, answer the user's question. "
-                    "If the snippets do not contain the required information, say so. Cite relevant facts but do not hallucinate.\n\n"
-                    f"User question: {prompt}\n\n"
-                    f"Search snippets:\n{chr(10).join(snippets)}\n\nAnswer:"
-                )
-
+                search_prompt = _search_prompt(prompt, results)
                 yield _encode(model, "Synthesizing answer from live snippets…")
-                final_text = _call_model(search_prompt, model)
+                final_text = await asyncio.to_thread(_call_model, search_prompt, model, "search_answer")
                 yield _encode(model, final_text)
 
             except HTTPException as exc:
@@ -230,7 +211,42 @@ async def chat_endpoint(request: Request):
         raise HTTPException(status_code=500, detail=str(exc))
 
 
-def _call_model(prompt: str, model: str) -> str:
+def _format_snippets(results: list[dict]) -> str:
+    return "\n".join(
+        f"{idx}. {result.get('title','')}\n{result.get('snippet','')}\n{result.get('url','')}"
+        for idx, result in enumerate(results, start=1)
+    )
+
+
+def _search_prompt(question: str, results: list[dict]) -> str:
+    """
+    Synthesis prompt over search results. With CHAT_SEARCH_COMPACT the
+    snippets are deduplicated and cut down to the sentences most relevant to
+    the question so the whole prompt stays near CHAT_SEARCH_PROMPT_TOKENS.
+    """
+    def build(snippets: str) -> str:
+        return (
+            "You indicated you needed real-time information. Using ONLY the verified snippets below, answer the user's question. "
+            "If the snippets do not contain the required information, say so. Cite relevant facts but do not hallucinate.\n\n"
+            f"User question: {question}\n\n"
+            f"Search snippets:\n{snippets}\n\nAnswer:"
+        )
+
+    full = build(_format_snippets(results))
+    metrics.incr("chat.search_prompt.raw_tokens", estimate_tokens(full))
+    if not CHAT_SEARCH_COMPACT:
+        return full
+    started = time.perf_counter()
+    budget = max(64, CHAT_SEARCH_PROMPT_TOKENS - estimate_tokens(build("")))
+    compacted = compact_results(question, results, budget) or results[:1]
+    prompt = build(_format_snippets(compacted))
+    metrics.observe("chat.search_prompt.compaction", time.perf_counter() - started)
+    metrics.incr("chat.search_prompt.compacted_tokens", estimate_tokens(prompt))
+    return prompt
+
+
+def _call_model(prompt: str, model: str, label: str | None = None) -> str:
+    """Generate a reply; with `label`, record chat.<label> latency and prompt tokens."""
     # Enforce residency policy: at most N models loaded; unload LRU if needed.
     try:
         ollama.ensure_capacity_before_use(model)
@@ -238,6 +254,7 @@ def _call_model(prompt: str, model: str) -> str:
         # Don't block on policy issues; proceed to call the model.
         pass
     payload = {"model": model, "prompt": prompt, "stream": False}
+    started = time.perf_counter()
     resp = requests.post(f"{OLLAMA_HOST}/api/generate", json=payload, timeout=120)
     if resp.status_code != 200:
         try:
@@ -247,6 +264,10 @@ def _call_model(prompt: str, model: str) -> str:
             message = f"HTTP {resp.status_code} from model service"
         raise HTTPException(status_code=502, detail=message)
     data = resp.json()
+    if label:
+        metrics.observe(f"chat.{label}", time.perf_counter() - started)
+        metrics.incr(f"chat.{label}.prompt_tokens", data.get("prompt_eval_count") or estimate_tokens(prompt))
+        metrics.incr(f"chat.{label}.requests")
     try:
         ollama.touch_model(model)
     except Exception:
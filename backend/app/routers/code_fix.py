@@ -1,24 +1,101 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from app.services.code_fix_service import run_code_fix
+import asyncio
+import json
+from typing import List
+
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from app.services.code_fix_service import expand_uploads, run_code_fix, stream_code_fix, stream_code_fix_batch
 
 
 router = APIRouter(prefix="/api", tags=["Code Fix"])
 
 
-@router.post("/codefix")
-async def code_fix_endpoint(
-    file: UploadFile = File(...),
-    model: str = Form("granite4:tiny-h"),
-):
+async def _read_source(file: UploadFile) -> str:
     try:
         raw = await file.read()
-        content = raw.decode("utf-8", errors="ignore")
+        return raw.decode("utf-8", errors="ignore")
     except Exception as exc:
         raise HTTPException(status_code=400, detail=f"Unable to read file: {exc}") from exc
 
-    result = run_code_fix(file.filename, content, model)
+
+@router.post("/codefix")
+async def code_fix_endpoint(
+    file: UploadFile = File(...),
+    model: str = Form("granite4:tiny-h"),
+    mode: str | None = Form(None),
+):
+    """mode = "full" | "units" | "patch" | "auto" (default from env)"""
+    content = await _read_source(file)
+    result = await run_code_fix(file.filename, content, model, mode)
     return {
         "filename": file.filename,
         "model": model,
         **result,
     }
+
+
+@router.post("/codefix/stream")
+async def code_fix_stream_endpoint(
+    request: Request,
+    file: UploadFile = File(...),
+    model: str = Form("granite4:tiny-h"),
+    mode: str | None = Form(None),
+):
+    """
+    Streaming code fix: NDJSON events (fallback, delta... / plan, unit... / patch, done).
+    The heuristic result arrives first; model output follows as it is
+    generated. Disconnecting cancels the model requests.
+    """
+    content = await _read_source(file)
+    filename = file.filename
+    events = stream_code_fix(filename, content, model, mode)
+
+    async def ndjson():
+        try:
+            yield json.dumps({"type": "meta", "filename": filename, "model": model}) + "\n"
+            async for event in events:
+                if await request.is_disconnected():
+                    break
+                yield json.dumps(event) + "\n"
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@router.post("/codefix/batch")
+async def code_fix_batch_endpoint(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    model: str = Form("granite4:tiny-h"),
+    mode: str | None = Form(None),
+):
+    """
+    Fix several source files and/or zip archives of them.
+    Streams one NDJSON "file" event per file as it completes, then a
+    "summary" event. Files unchanged since a previous fix are served from
+    cache. Disconnecting cancels the remaining files.
+    """
+    try:
+        uploads = [(f.filename, await f.read()) for f in files]
+    except Exception as exc:
+        raise HTTPException(status_code=400, detail=f"Unable to read upload: {exc}") from exc
+    try:
+        sources, skipped = await asyncio.to_thread(expand_uploads, uploads)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    del uploads
+    if not sources:
+        raise HTTPException(status_code=400, detail="No supported source files in upload")
+    events = stream_code_fix_batch(sources, model, mode, skipped)
+
+    async def ndjson():
+        try:
+            async for event in events:
+                if await request.is_disconnected():
+                    break
+                yield json.dumps(event) + "\n"
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
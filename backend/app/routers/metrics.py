@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from app.utils.metrics import snapshot
+
+
+router = APIRouter(prefix="/api", tags=["Metrics"])
+
+
+@router.get("/metrics")
+def get_metrics():
+    """Process-local cache and latency counters."""
+    return snapshot()
@@ -1,6 +1,12 @@
+import asyncio
+import json
+import shutil
+import tempfile
+from typing import List
+
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse
-from app.services.ocr_service import process_ocr
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.services.ocr_service import process_ocr, ocr_batch, iter_upload_pages
 
 
 router = APIRouter(prefix="/api", tags=["OCR"])
@@ -10,15 +16,60 @@ router = APIRouter(prefix="/api", tags=["OCR"])
 async def ocr_process(
     file: UploadFile = File(...),
     mode: str = Form("extract_text"),
+    tiled: bool = Form(False),
 ):
     """
     Handles OCR / Image Description processing.
     mode = "extract_text" | "describe"
+    tiled = read tall, dense pages in overlapping bands (extract_text only)
     """
     try:
-        result = await process_ocr(file, mode)
-        return JSONResponse(content={"text": result})
+        result = await process_ocr(file, mode, tiled)
+        return JSONResponse(content=result)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def _spool(fh):
+    # Upload files are closed once the endpoint returns, before the stream runs.
+    tmp = tempfile.TemporaryFile()
+    fh.seek(0)
+    shutil.copyfileobj(fh, tmp)
+    return tmp
+
+
+@router.post("/ocr/batch")
+async def ocr_batch_process(
+    files: List[UploadFile] = File(...),
+    mode: str = Form("extract_text"),
+):
+    """
+    OCR several images and/or PDFs (rasterized page by page).
+    Streams one NDJSON line per page in input order, then a final
+    {"done": true, "pages": n} line.
+    """
+    spooled = []
+    try:
+        for f in files:
+            spooled.append((f.filename, await asyncio.to_thread(_spool, f.file)))
+    except Exception as e:
+        for _, tmp in spooled:
+            tmp.close()
+        raise HTTPException(status_code=400, detail=f"Unable to read upload: {e}")
+
+    async def stream_pages():
+        pages = 0
+        try:
+            async for result in ocr_batch(iter_upload_pages(spooled), mode):
+                pages += 1
+                yield json.dumps(result) + "\n"
+        except Exception as exc:
+            yield json.dumps({"error": f"Batch OCR failed: {exc}"}) + "\n"
+        finally:
+            for _, tmp in spooled:
+                tmp.close()
+        yield json.dumps({"done": True, "pages": pages}) + "\n"
+
+    return StreamingResponse(stream_pages(), media_type="application/x-ndjson")
@@ -15,7 +15,7 @@ class SearchRequest(BaseModel):
 @router.post("/search")
 async def search_endpoint(payload: SearchRequest):
     try:
-        results = langsearch(payload.query.strip(), payload.limit)
+        results = await langsearch(payload.query.strip(), payload.limit)
         return {"query": payload.query.strip(), "results": results}
     except LangSearchError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
@@ -1,5 +1,8 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from app.services.translation_service import process_translation
+import json
+
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from app.services.translation_service import process_translation, stream_translation
 
 
 router = APIRouter(prefix="/api", tags=["Translation & Summary"])
@@ -9,20 +12,59 @@ router = APIRouter(prefix="/api", tags=["Translation & Summary"])
 async def translate_text(
     language: str = Form("English"),
     file: UploadFile = File(...),
+    summary_mode: str | None = Form(None),
 ):
     """
     Handles text translation and summarization.
     Expects an uploaded .txt file (e.g. Arabic text),
     and returns both translated and summarized versions.
+    summary_mode = "sequential" | "pipelined" | "source" (default from env)
     """
     try:
-        result = await process_translation(file, language)
+        result = await process_translation(file, language, summary_mode)
         return {
             "original": result["original"],
             "translation": result["translation"],
             "summary": result["summary"],
+            "segments": result.get("segments", 1),
+            "reuse": result.get("reuse"),
+            "timings": result.get("timings"),
         }
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/translation/stream")
+async def translate_text_stream(
+    request: Request,
+    language: str = Form("English"),
+    file: UploadFile = File(...),
+    summary_mode: str | None = Form(None),
+):
+    """
+    Streaming translation: NDJSON events (meta, segment..., summary, done).
+    Segments arrive in document order as soon as each one is ready.
+    Disconnecting stops all outstanding model calls.
+    """
+    events = stream_translation(file, language, summary_mode)
+    try:
+        # Surface read/limit errors as HTTP errors before the stream starts.
+        first = await events.__anext__()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def ndjson():
+        try:
+            yield json.dumps(first) + "\n"
+            async for event in events:
+                if await request.is_disconnected():
+                    break
+                yield json.dumps(event) + "\n"
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
@@ -1,21 +1,37 @@
+from contextlib import aclosing
+
 from fastapi import APIRouter, HTTPException, Query
 
-from app.services.weather_service import WeatherError, realtime, forecast, forecast_hourly
+from app.services.weather_service import WeatherError, fetch_weather, gazetteer
 
 
 router = APIRouter(prefix="/api", tags=["Weather"])
 
 
 @router.get("/weather")
-def get_weather(
+async def get_weather(
     location: str = Query(..., description="City name or 'lat,lon'"),
     units: str | None = Query(None),
 ):
-    try:
-        current = realtime(location, units)
-        loc_for_forecast = current.get("resolved_location") or location
-        daily = forecast(loc_for_forecast, units)
-        hourly = forecast_hourly(loc_for_forecast, units, hours=12)
-        return {"weather": {"current": current, "daily": daily, "hourly": hourly}}
-    except WeatherError as exc:
-        raise HTTPException(status_code=502, detail=str(exc))
+    # Current conditions, daily and hourly forecasts are fetched concurrently.
+    weather = {}
+    async with aclosing(fetch_weather(location, units, hours=12)) as parts:
+        async for part, value in parts:
+            if isinstance(value, WeatherError):
+                raise HTTPException(status_code=502, detail=str(value))
+            weather[part] = value
+    return {"weather": weather}
+
+
+@router.get("/weather/locations")
+def suggest_locations(
+    q: str = Query(..., min_length=1, description="Start of a city name"),
+    limit: int = Query(8, ge=1, le=25),
+):
+    """Offline city suggestions from the bundled gazetteer (no network call)."""
+    return {
+        "locations": [
+            {"name": p.name, "label": p.label, "location": f"{p.lat},{p.lon}", "country": p.country_code}
+            for p in gazetteer().suggest(q, limit)
+        ]
+    }
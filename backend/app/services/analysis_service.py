@@ -1,21 +1,93 @@
 import io, pandas as pd
+from app.utils.excel_reader import read_excel
 
 
-def preview_table(file_bytes: bytes, filename: str):
-    buf = io.BytesIO(file_bytes)
+MAX_CHART_CATEGORIES = 50
+TOP_VALUES = 5
+
+
+def read_table(file_bytes: bytes, filename: str, sheet=0):
     if filename.endswith(".csv"):
-        df = pd.read_csv(buf)
-    else:
-        df = pd.read_excel(buf)
+        return pd.read_csv(io.BytesIO(file_bytes))
+    return read_excel(file_bytes, sheet)
+
+
+def preview_table(file_bytes: bytes, filename: str):
+    df = read_table(file_bytes, filename)
     return df.head(5).to_dict(orient="records"), list(df.columns)
 
 
-def bar_png(df, x_col, y_col):
+def _scalar(v):
+    if v is None or (not isinstance(v, (list, dict)) and pd.isna(v)):
+        return None
+    if hasattr(v, "isoformat"):
+        return v.isoformat()
+    if hasattr(v, "item"):
+        return v.item()
+    return v
+
+
+def profile_columns(df):
+    """
+    Per-column profile used to steer chart/aggregate requests away from
+    ID-like or free-text axes. Counts are computed column-wise over the whole
+    frame at once; only top values need a per-column value_counts.
+    """
+    nulls = df.isna().sum()
+    uniques = df.nunique(dropna=True)
+    orderable = df.select_dtypes(include=["number", "datetime", "bool"])
+    bounds = orderable.agg(["min", "max"]) if not orderable.empty else None
+    rows = len(df)
+    profile = {}
+    for col in df.columns:
+        top = df[col].value_counts(dropna=True).head(TOP_VALUES)
+        profile[str(col)] = {
+            "dtype": str(df[col].dtype),
+            "nulls": int(nulls[col]),
+            "cardinality": int(uniques[col]),
+            "numeric": bool(pd.api.types.is_numeric_dtype(df[col])),
+            "unique_ratio": round(int(uniques[col]) / rows, 4) if rows else 0.0,
+            "min": _scalar(bounds[col]["min"]) if bounds is not None and col in bounds else None,
+            "max": _scalar(bounds[col]["max"]) if bounds is not None and col in bounds else None,
+            "top": [{"value": _scalar(k), "count": int(c)} for k, c in top.items()],
+        }
+    return profile
+
+
+def summarize_table(df):
+    """Return (preview, columns, profile) for an already parsed table."""
+    return df.head(5).to_dict(orient="records"), list(df.columns), profile_columns(df)
+
+
+def check_axes(profile: dict, x_col: str, y_col: str):
+    """
+    Validate a chart/aggregate request against the stored profile before any
+    parsing happens. Returns (ok, message, bucket) where bucket=True means the
+    x axis is numeric with too many distinct values and should be binned.
+    """
+    for col in (x_col, y_col):
+        if col not in profile:
+            return False, f"Unknown column: {col}", False
+    if not profile[y_col]["numeric"]:
+        return False, f"Column '{y_col}' is not numeric and cannot be aggregated", False
+    x = profile[x_col]
+    if x["cardinality"] <= MAX_CHART_CATEGORIES:
+        return True, "ok", False
+    if x["numeric"]:
+        return True, "ok", True
+    return False, (
+        f"Column '{x_col}' has {x['cardinality']} distinct values "
+        f"(limit {MAX_CHART_CATEGORIES}); pick a lower-cardinality x axis"
+    ), False
+
+
+def bar_png(df, x_col, y_col, bucket: bool = False):
     import matplotlib.pyplot as plt
     import base64
     fig, ax = plt.subplots()
-    df.groupby(x_col)[y_col].sum().plot(kind="bar", ax=ax)
+    key = pd.cut(df[x_col], bins=MAX_CHART_CATEGORIES) if bucket else x_col
+    df.groupby(key, observed=True)[y_col].sum().plot(kind="bar", ax=ax)
     out = io.BytesIO()
     plt.tight_layout(); fig.savefig(out, format="png"); plt.close(fig)
     out.seek(0)
-    return out.read()
\ No newline at end of file
+    return out.read()
@@ -1,14 +1,57 @@
+from contextlib import aclosing
 from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 import ast
-import difflib
+import asyncio
+import io
+import json
 import logging
 import os
-import re
+import time
+import zipfile
 
-import requests
+import aiohttp
+
+from app.utils import metrics
+from app.utils.disk_cache import TieredCache, content_hash
+from app.utils.code_units import CodeUnit, partition, splice, unit_at
+from app.utils.patching import NO_CHANGES, PatchError, apply_search_replace, parse_search_replace
+from app.utils.symbols import SymbolTable, TypoIndex, apply_renames
 
 
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://ollama-dev:11434")
+CODE_FIX_TIMEOUT = int(os.getenv("CODE_FIX_TIMEOUT", "120") or 120)
+# "full" rewrites the whole file in one prompt; "units" rewrites only the
+# top-level functions/classes/statement blocks flagged by static analysis
+# (Python only; falls back to "full" when nothing is flagged); "patch" asks
+# for SEARCH/REPLACE edits only and falls back to "full" when they do not
+# apply; "auto" uses units for Python files of at least
+# CODE_FIX_UNIT_MIN_LINES lines and full otherwise.
+CODE_FIX_MODES = ("auto", "full", "units", "patch")
+CODE_FIX_MODE = os.getenv("CODE_FIX_MODE", "auto")
+CODE_FIX_UNIT_MIN_LINES = int(os.getenv("CODE_FIX_UNIT_MIN_LINES", "150") or 150)
+CODE_FIX_CONCURRENCY = max(1, int(os.getenv("CODE_FIX_CONCURRENCY", "3") or 3))
+# Batch limits. Zip entries are checked against the per-file limit before
+# they are decompressed.
+CODE_FIX_BATCH_MAX_FILES = int(os.getenv("CODE_FIX_BATCH_MAX_FILES", "200") or 200)
+CODE_FIX_MAX_FILE_BYTES = int(float(os.getenv("CODE_FIX_MAX_FILE_KB", "512") or 512) * 1024)
+CODE_FIX_BATCH_MAX_BYTES = int(float(os.getenv("CODE_FIX_BATCH_MAX_MB", "20") or 20) * 1024 * 1024)
+# Same list the Code Fix page accepts.
+CODE_EXTENSIONS = (
+    ".js", ".jsx", ".ts", ".tsx", ".py", ".rb", ".java", ".go", ".rs", ".cpp",
+    ".c", ".cs", ".php", ".swift", ".kt", ".json", ".txt",
+)
+
+# Previous model fixes by (content hash, filename, model, mode).
+_FIX_CACHE = TieredCache(
+    os.getenv("CODE_FIX_CACHE_DIR", "/app/codefix_cache"),
+    memory_items=int(os.getenv("CODE_FIX_CACHE_ITEMS", "128") or 128),
+    disk_items=int(os.getenv("CODE_FIX_CACHE_DISK_ITEMS", "5000") or 5000),
+)
+
+# Shared by all code-fix requests (single, unit rewrites, batches) so the
+# model never sees more than CODE_FIX_CONCURRENCY generations from us.
+_MODEL_SLOTS = asyncio.Semaphore(CODE_FIX_CONCURRENCY)
 
 
 def _host_candidates():
@@ -19,112 +62,484 @@ def _host_candidates():
             yield host
 
 
-def run_code_fix(filename: str, content: str, model: str = "granite4:tiny-h") -> dict:
+async def run_code_fix(filename: str, content: str, model: str = "granite4:tiny-h", mode: str | None = None) -> dict:
+    """
+    Ask the model for a corrected version of the file; if the model is
+    unreachable, returns nothing usable, or breaks the syntax, fall back to
+    the heuristic fixer. Same pipeline as stream_code_fix, without the events.
+    """
+    result: dict = {}
+    async for event in stream_code_fix(filename, content, model, mode):
+        if event["type"] == "done":
+            result = {k: v for k, v in event.items() if k != "type"}
+    return result
+
+
+async def stream_code_fix(
+    filename: str, content: str, model: str = "granite4:tiny-h", mode: str | None = None
+) -> AsyncIterator[dict]:
+    """
+    Streaming variant of run_code_fix. Events:
+      {"type": "fallback", summary, fixed_code, changes}  heuristic result, sent first
+      {"type": "delta", "text"}                           full mode: model output as it is generated
+      {"type": "plan", "units": [...]}                    units mode: the units sent to the model
+      {"type": "unit", name, start, end, status, code}    units mode: one per unit as it completes
+      {"type": "patch", "applied", "edits"|"error"}       patch mode: whether the edits applied
+      {"type": "done", "source": "model"|"heuristic", "mode", summary, fixed_code, changes, usage}
+    `usage` reports the modes attempted, model requests, prompt/output tokens
+    and latency, so the output modes can be compared.
+    Closing the generator (e.g. on client disconnect) aborts the model requests.
+    """
+    fallback = await asyncio.to_thread(heuristic_fix, filename, content, model)
+    yield {"type": "fallback", **fallback}
+
+    mode, tree = _resolve_mode(mode, filename, content)
+    usage = {"attempts": [], "requests": 0, "prompt_tokens": 0, "output_tokens": 0}
+    started = time.perf_counter()
+    if mode == "units":
+        stages = _stream_units(filename, content, tree, model, fallback, usage)
+    elif mode == "patch":
+        stages = _stream_patch(filename, content, model, fallback, usage)
+    else:
+        stages = _stream_full(filename, content, model, fallback, usage)
+    async with aclosing(stages):
+        async for event in stages:
+            if event["type"] == "done":
+                event["usage"] = _record_usage(usage, time.perf_counter() - started)
+            yield event
+
+
+async def _stream_full(filename: str, content: str, model: str, fallback: dict, usage: dict) -> AsyncIterator[dict]:
+    usage["attempts"].append("full")
+    parts = []
+    try:
+        async with _session() as session:
+            async for chunk in _generate_stream(session, model, _rewrite_prompt(filename, content), usage):
+                parts.append(chunk)
+                yield {"type": "delta", "text": chunk}
+    except (RuntimeError, aiohttp.ClientError, asyncio.TimeoutError) as exc:
+        logging.getLogger("code_fix").warning("Model rewrite fallback: %s", exc)
+        yield {"type": "done", "source": "heuristic", "mode": "full", "error": str(exc), **fallback}
+        return
+
+    llm_code = _strip_fences("".join(parts))
+    if not llm_code.strip():
+        yield {"type": "done", "source": "heuristic", "mode": "full", **fallback}
+        return
+    yield {"type": "done", "source": "model", "mode": "full", **_model_result(filename, model, llm_code)}
+
+
+async def _stream_patch(filename: str, content: str, model: str, fallback: dict, usage: dict) -> AsyncIterator[dict]:
+    """Ask for SEARCH/REPLACE edits only; fall back to a full rewrite if they do not apply cleanly."""
+    usage["attempts"].append("patch")
+    try:
+        async with _session() as session:
+            reply = "".join([chunk async for chunk in _generate_stream(session, model, _patch_prompt(filename, content), usage)])
+    except (RuntimeError, aiohttp.ClientError, asyncio.TimeoutError) as exc:
+        logging.getLogger("code_fix").warning("Model patch fallback: %s", exc)
+        yield {"type": "done", "source": "heuristic", "mode": "patch", "error": str(exc), **fallback}
+        return
+
+    try:
+        blocks = parse_search_replace(_strip_fences(reply))
+        patched = apply_search_replace(content, blocks)
+        if _is_python(filename):
+            ast.parse(patched)
+    except (PatchError, SyntaxError) as exc:
+        yield {"type": "patch", "applied": False, "error": str(exc)}
+        metrics.incr("codefix.patch.rejected")
+        async for event in _stream_full(filename, content, model, fallback, usage):
+            yield event
+        return
+
+    yield {"type": "patch", "applied": True, "edits": len(blocks)}
+    detail = f"Model patch applied ({len(blocks)} edits)." if blocks else "Model found nothing to fix."
+    yield {"type": "done", "source": "model", "mode": "patch",
+           **_model_result(filename, model, patched, detail, changes=len(blocks))}
+
+
+def _record_usage(usage: dict, seconds: float) -> dict:
+    """Finalize per-request usage and fold it into metrics under the mode that produced the result."""
+    usage = {**usage, "latency_ms": round(seconds * 1000)}
+    label = "+".join(usage["attempts"]) or "none"
+    metrics.observe(f"codefix.{label}.latency", seconds)
+    metrics.incr(f"codefix.{label}.output_tokens", usage["output_tokens"])
+    metrics.incr(f"codefix.{label}.prompt_tokens", usage["prompt_tokens"])
+    return usage
+
+
+def expand_uploads(uploads: List[Tuple[str, bytes]]) -> Tuple[List[Tuple[str, str]], List[dict]]:
+    """
+    Turn uploaded files and zip archives into (path, source) pairs. Entries
+    that are not source files, are binary, hidden or too large are returned
+    as skipped (filename, reason) instead. Raises ValueError when the batch
+    exceeds the file-count or total-size limits.
+    """
+    files: List[Tuple[str, str]] = []
+    skipped: List[dict] = []
+    total = 0
+
+    def add(name: str, raw: bytes):
+        nonlocal total
+        if not name.lower().endswith(CODE_EXTENSIONS):
+            skipped.append({"filename": name, "reason": "unsupported file type"})
+            return
+        if len(raw) > CODE_FIX_MAX_FILE_BYTES:
+            skipped.append({"filename": name, "reason": f"larger than {CODE_FIX_MAX_FILE_BYTES // 1024}KB"})
+            return
+        if b"\x00" in raw[:8192]:
+            skipped.append({"filename": name, "reason": "binary file"})
+            return
+        total += len(raw)
+        if total > CODE_FIX_BATCH_MAX_BYTES:
+            raise ValueError(f"Batch exceeds {CODE_FIX_BATCH_MAX_BYTES // (1024 * 1024)}MB of source")
+        files.append((name, raw.decode("utf-8", errors="ignore")))
+
+    for name, raw in uploads:
+        name = name or "upload"
+        if not name.lower().endswith(".zip"):
+            add(name, raw)
+            continue
+        try:
+            archive = zipfile.ZipFile(io.BytesIO(raw))
+        except zipfile.BadZipFile:
+            skipped.append({"filename": name, "reason": "not a valid zip archive"})
+            continue
+        with archive:
+            for info in archive.infolist():
+                parts = info.filename.split("/")
+                if info.is_dir() or parts[0] == "__MACOSX" or any(p.startswith(".") for p in parts if p):
+                    continue
+                if info.file_size > CODE_FIX_MAX_FILE_BYTES:
+                    skipped.append({"filename": info.filename, "reason": f"larger than {CODE_FIX_MAX_FILE_BYTES // 1024}KB"})
+                    continue
+                add(info.filename, archive.read(info))
+        if len(files) > CODE_FIX_BATCH_MAX_FILES:
+            break
+    if len(files) > CODE_FIX_BATCH_MAX_FILES:
+        raise ValueError(f"Batch has more than {CODE_FIX_BATCH_MAX_FILES} source files")
+    return files, skipped
+
+
+async def _fix_with_cache(filename: str, content: str, model: str, mode: str | None) -> Tuple[dict, str]:
+    """
+    run_code_fix behind the content-hash cache. Returns (result, status) where
+    status is "fixed", "fallback" (model unavailable, heuristic result),
+    "cached" (same source fixed before) or "unchanged" (the source is the
+    output of a previous fix).
+    """
+    mode_key = (mode or CODE_FIX_MODE or "auto").lower()
+    key = TieredCache.make_key(content_hash(content.encode("utf-8")), filename, model, mode_key)
+    cached, tier = await asyncio.to_thread(_FIX_CACHE.get, key)
+    if tier:
+        metrics.incr(f"codefix.cache.{tier}_hit")
+        # Copy: the memory tier hands back the stored dict itself.
+        result = dict(cached)
+        already_fixed = result.pop("already_fixed", False)
+        return result, ("unchanged" if already_fixed else "cached")
+    metrics.incr("codefix.cache.miss")
+
+    result = await run_code_fix(filename, content, model, mode)
+    if result.get("source") != "model":
+        # Heuristic fallbacks mean the model was unavailable; try again next time.
+        return result, "fallback"
+    stored = {k: result[k] for k in ("source", "mode", "summary", "fixed_code", "changes")}
+    await asyncio.to_thread(_FIX_CACHE.set, key, stored)
+    fixed_key = TieredCache.make_key(content_hash(result["fixed_code"].encode("utf-8")), filename, model, mode_key)
+    if fixed_key != key:
+        await asyncio.to_thread(_FIX_CACHE.set, fixed_key, {
+            **stored,
+            "summary": f"`{filename}` is unchanged since it was last fixed with {model}.",
+            "changes": 0,
+            "already_fixed": True,
+        })
+    return result, "fixed"
+
+
+async def stream_code_fix_batch(
+    files: List[Tuple[str, str]], model: str = "granite4:tiny-h", mode: str | None = None, skipped: List[dict] | None = None
+) -> AsyncIterator[dict]:
     """
-    Placeholder code-fix agent that pretends to run a model and returns a summary
-    plus a lightly formatted version of the provided source.
-    In a future iteration this can call a real LLM agent.
+    Fix many files concurrently. Model calls share the process-wide slots, so
+    a batch never exceeds CODE_FIX_CONCURRENCY generations. Events:
+      {"type": "file", filename, status, ...result}  one per file, as each completes
+      {"type": "summary", files, fixed, cached, unchanged, fallback, failed, skipped, changes, ...}
+    Closing the generator cancels all outstanding files.
     """
-    llm_code = _try_model_rewrite(filename, content, model)
-    if llm_code:
-        cleaned = llm_code.strip()
-        if not cleaned.endswith("\n"):
-            cleaned += "\n"
-        summary = (
-            f"Processed `{filename}` with {model}. Model rewrite applied based on detected issues."
-            f" (Completed {datetime.utcnow().isoformat()}Z)"
-        )
-        logging.getLogger("code_fix").info("Fixed code for %s via model:\n%s", filename, cleaned)
-        return {"summary": summary, "fixed_code": cleaned, "changes": 1}
-
-    # fallback heuristic approach
+    started = time.perf_counter()
+    skipped = skipped or []
+    totals = {
+        "files": len(files), "fixed": 0, "cached": 0, "unchanged": 0, "fallback": 0, "failed": 0,
+        "skipped": len(skipped), "changes": 0, "prompt_tokens": 0, "output_tokens": 0,
+    }
+    for item in skipped:
+        yield {"type": "file", "status": "skipped", **item}
+
+    # Bound how many files hold their source, heuristic result and model
+    # output in memory at once; model concurrency is bounded separately.
+    in_flight = asyncio.Semaphore(2 * CODE_FIX_CONCURRENCY)
+
+    async def one(name: str, content: str):
+        async with in_flight:
+            try:
+                result, status = await _fix_with_cache(name, content, model, mode)
+            except Exception as exc:  # one bad file must not sink the batch
+                logging.getLogger("code_fix").warning("Batch fix failed for %s: %s", name, exc)
+                return name, {"error": str(exc)}, "failed"
+        return name, result, status
+
+    tasks = [asyncio.create_task(one(name, content)) for name, content in files]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            name, result, status = await next_done
+            totals[status] += 1
+            totals["changes"] += result.get("changes") or 0
+            usage = result.get("usage") or {}
+            totals["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            totals["output_tokens"] += usage.get("output_tokens", 0)
+            yield {"type": "file", "filename": name, "status": status, **result}
+    finally:
+        for task in tasks:
+            task.cancel()
+    totals["elapsed_ms"] = round((time.perf_counter() - started) * 1000)
+    metrics.observe("codefix.batch.latency", time.perf_counter() - started)
+    yield {"type": "summary", **totals}
+
+
+def _resolve_mode(mode: str | None, filename: str, content: str) -> Tuple[str, Optional[ast.Module]]:
+    mode = (mode or CODE_FIX_MODE or "auto").lower()
+    if mode not in CODE_FIX_MODES:
+        mode = "auto"
+    if mode in ("full", "patch"):
+        return mode, None
+    if not _is_python(filename):
+        # Units are Python top-level definitions; other files are sent whole.
+        return "full", None
+    if mode == "auto" and content.count("\n") + 1 < CODE_FIX_UNIT_MIN_LINES:
+        return "full", None
+    try:
+        return "units", ast.parse(content)
+    except SyntaxError:
+        # Cannot partition a file that does not parse; let the model see all of it.
+        return "full", None
+
+
+async def _stream_units(
+    filename: str, content: str, tree: ast.Module, model: str, fallback: dict, usage: dict
+) -> AsyncIterator[dict]:
+    usage["attempts"].append("units")
+    units = partition(content, tree)
+    flagged = _flag_units(tree, units)
+    stats = {"total": len(units), "flagged": len(flagged), "rewritten": 0, "rejected": 0}
+    yield {
+        "type": "plan",
+        "units": [
+            {"name": units[i].name, "kind": units[i].kind, "start": units[i].start, "end": units[i].end, "issues": issues}
+            for i, issues in sorted(flagged.items())
+        ],
+    }
+    if not flagged:
+        # Static analysis only sees undefined names; other bugs need the model
+        # to read the whole file.
+        async with aclosing(_stream_full(filename, content, model, fallback, usage)) as full:
+            async for event in full:
+                yield event
+        return
+
     lines = content.splitlines()
-    trimmed_lines = [line.rstrip() for line in lines]
-    trimmed = "\n".join(trimmed_lines)
+    context = _top_level_names(tree)
+    replacements: Dict[int, str] = {}
+    async with _session() as session:
+        rewrites = _rewrite_units(session, filename, lines, units, flagged, context, model, usage)
+        async with aclosing(rewrites):
+            async for idx, fixed, problem in rewrites:
+                unit = units[idx]
+                if fixed is None:
+                    stats["rejected"] += 1
+                else:
+                    replacements[idx] = fixed
+                    stats["rewritten"] += 1
+                yield {
+                    "type": "unit", "name": unit.name, "start": unit.start, "end": unit.end,
+                    "status": "rewritten" if fixed is not None else "rejected", "error": problem, "code": fixed,
+                }
+
+    if not replacements:
+        yield {"type": "done", "source": "heuristic", "mode": "units", "units": stats, **fallback}
+        return
+    merged = splice(content, units, replacements)
+    try:
+        ast.parse(merged)
+    except SyntaxError as exc:
+        yield {"type": "done", "source": "heuristic", "mode": "units", "units": stats,
+               "error": f"Reassembled file failed syntax check: {exc}", **fallback}
+        return
+    detail = f"Model rewrote {len(replacements)} of {len(units)} top-level units flagged by static analysis."
+    yield {"type": "done", "source": "model", "mode": "units", "units": stats,
+           **_model_result(filename, model, merged, detail, changes=len(replacements))}
+
+
+async def _rewrite_units(
+    session: aiohttp.ClientSession,
+    filename: str,
+    lines: List[str],
+    units: List[CodeUnit],
+    flagged: Dict[int, List[str]],
+    context: List[str],
+    model: str,
+    usage: dict,
+) -> AsyncIterator[Tuple[int, Optional[str], Optional[str]]]:
+    """Rewrite flagged units concurrently; yield (index, code or None, problem) as each finishes."""
+
+    async def one(idx: int):
+        unit = units[idx]
+        prompt = _unit_prompt(filename, unit, unit.text(lines), flagged[idx], context)
+        try:
+            text = "".join([chunk async for chunk in _generate_stream(session, model, prompt, usage)])
+        except (RuntimeError, aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            return idx, None, str(exc)
+        fixed = _strip_fences(text)
+        problem = _check_unit(unit, fixed)
+        return idx, (None if problem else fixed), problem
+
+    tasks = [asyncio.create_task(one(idx)) for idx in sorted(flagged)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _check_unit(unit: CodeUnit, code: str) -> Optional[str]:
+    if not code.strip():
+        return "empty response"
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as exc:
+        return f"syntax error: {exc}"
+    if unit.kind in ("function", "class"):
+        names = {getattr(node, "name", None) for node in tree.body}
+        if unit.name not in names:
+            return f"response does not define `{unit.name}`"
+    return None
+
+
+def _flag_units(tree: ast.Module, units: List[CodeUnit]) -> Dict[int, List[str]]:
+    """Map unit index -> issues found in it by the static analyzer."""
+    flagged: Dict[int, List[str]] = {}
+    for name, refs in sorted(SymbolTable(tree).undefined().items()):
+        for lineno in sorted({ref.lineno for ref in refs}):
+            idx = unit_at(units, lineno)
+            if idx is not None:
+                flagged.setdefault(idx, []).append(f"`{name}` is undefined (line {lineno})")
+    return flagged
+
+
+def _top_level_names(tree: ast.Module) -> List[str]:
+    names = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.append(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.extend((a.asname or a.name).split(".")[0] for a in node.names)
+        elif isinstance(node, ast.Assign):
+            names.extend(t.id for t in node.targets if isinstance(t, ast.Name))
+    return names
+
+
+def _unit_prompt(filename: str, unit: CodeUnit, code: str, issues: List[str], context: List[str]) -> str:
+    label = {"imports": "import block", "statements": "block of module-level statements"}.get(unit.kind, unit.kind)
+    return (
+        f"You are an expert software engineer. Fix one {label} taken from a larger source file. "
+        "Static analysis found:\n"
+        + "".join(f"- {issue}\n" for issue in issues)
+        + f"Other top-level names defined in the file: {', '.join(context[:200])}\n"
+        "Correct these issues and any other obvious bugs while preserving style. "
+        f"Return ONLY the corrected {label}, starting at column 0, with no commentary or code fences.\n"
+        f"Filename: {filename} (lines {unit.start}-{unit.end})\n"
+        "---------\n"
+        f"{code}\n"
+        "---------"
+    )
+
+
+def _strip_fences(text: str) -> str:
+    stripped = text.strip()
+    if stripped.startswith("```"):
+        stripped = stripped.split("\n", 1)[1] if "\n" in stripped else ""
+        if stripped.rstrip().endswith("```"):
+            stripped = stripped.rstrip()[:-3]
+    return stripped
+
+
+def _model_result(
+    filename: str, model: str, llm_code: str,
+    detail: str = "Model rewrite applied based on detected issues.", changes: int = 1,
+) -> dict:
+    cleaned = llm_code.strip()
+    if not cleaned.endswith("\n"):
+        cleaned += "\n"
+    summary = (
+        f"Processed `{filename}` with {model}. {detail}"
+        f" (Completed {datetime.utcnow().isoformat()}Z)"
+    )
+    logging.getLogger("code_fix").info("Fixed code for %s via model:\n%s", filename, cleaned)
+    return {"summary": summary, "fixed_code": cleaned, "changes": changes}
+
+
+def _is_python(filename: str) -> bool:
+    return (filename or "").lower().endswith((".py", ".pyw"))
+
 
+def heuristic_fix(filename: str, content: str, model: str = "granite4:tiny-h") -> dict:
+    """
+    Model-free fixer: renames undefined identifiers to the closest name
+    visible in their scope, then normalizes whitespace. CPU-bound; call via
+    asyncio.to_thread.
+    """
     touched = 0
     suggestions = []
+
+    # Undefined identifiers -> closest visible name, renamed in one pass.
+    # Only for Python: JSON and friends often parse as Python expressions.
+    source = content
+    table = None
+    if _is_python(filename):
+        try:
+            table = SymbolTable(ast.parse(content))
+        except SyntaxError:
+            pass
+    if table is not None:
+        undefined = table.undefined()
+        index = TypoIndex(table.rename_targets()) if undefined else None
+        renames = {}
+        for name, refs in sorted(undefined.items()):
+            by_scope = {}
+            for ref in refs:
+                if ref.scope not in by_scope:
+                    by_scope[ref.scope] = table.suggest(name, ref.scope, index)
+                if by_scope[ref.scope]:
+                    renames[(ref.lineno, ref.col)] = (name, by_scope[ref.scope])
+        source, applied = apply_renames(content, renames)
+        for old, new in sorted(applied):
+            suggestions.append(f"Renamed `{old}` to `{new}`.")
+            touched += 1
+
     # Basic formatting and lint
+    line_list = [line.rstrip() for line in source.splitlines()]
     if "\t" in content:
         suggestions.append("Converted tabs to spaces.")
-        trimmed = trimmed.replace("\t", "    ")
+        line_list = [line.replace("\t", "    ") for line in line_list]
         touched += 1
     if not content.endswith("\n"):
-        trimmed += "\n"
         suggestions.append("Ensured file ends with a newline.")
         touched += 1
     if "TODO" in content.upper():
         suggestions.append("Flagged TODO items for follow-up.")
 
-    # Parse AST to discover undefined identifiers.
-    undefined_names = set()
-    defined_names = set()
-    try:
-        tree = ast.parse(content)
-
-        class Analyzer(ast.NodeVisitor):
-            def visit_Assign(self, node):
-                for target in node.targets:
-                    if isinstance(target, ast.Name):
-                        defined_names.add(target.id)
-                self.generic_visit(node)
-
-            def visit_FunctionDef(self, node):
-                defined_names.add(node.name)
-                for arg in node.args.args:
-                    defined_names.add(arg.arg)
-                self.generic_visit(node)
-
-            def visit_With(self, node):
-                for item in node.items:
-                    if isinstance(item.optional_vars, ast.Name):
-                        defined_names.add(item.optional_vars.id)
-                self.generic_visit(node)
-
-        Analyzer().visit(tree)
-        builtin_allow = set(dir(__builtins__)) | {"self"}
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
-                if node.id not in defined_names and node.id not in builtin_allow:
-                    undefined_names.add(node.id)
-    except SyntaxError:
-        pass
-
-    # Attempt to auto-fix undefined names by matching close defined names.
-    fixes = []
-    for name in sorted(undefined_names):
-        match = difflib.get_close_matches(name, defined_names, n=1, cutoff=0.75)
-        if match:
-            fixes.append((name, match[0]))
-
-    def apply_rename(lines: list[str], old: str, new: str):
-        updated = []
-        applied = False
-        pattern = re.compile(rf"\b{re.escape(old)}\b")
-        for line in lines:
-            if pattern.search(line):
-                line = pattern.sub(new, line)
-                applied = True
-            updated.append(line)
-        return updated, applied
-
-    line_list = trimmed_lines[:]
-    for old, new in fixes:
-        line_list, inserted = apply_rename(line_list, old, new)
-        if inserted:
-            suggestions.append(f"Renamed `{old}` to `{new}`.")
-            touched += 1
-
-    if fixes and not suggestions:
-        suggestions.append("Corrected identifier typos.")
-
-    stripped_comments = []
-    for line in line_list:
-        if line.strip().startswith("#"):
-            continue
-        stripped_comments.append(line)
-
-    trimmed = "\n".join(stripped_comments)
+    stripped_comments = [line for line in line_list if not line.strip().startswith("#")]
+    trimmed = "\n".join(stripped_comments) + "\n"
 
     summary = (
         f"Processed `{filename}` with {model}. "
@@ -141,8 +556,12 @@ def run_code_fix(filename: str, content: str, model: str = "granite4:tiny-h") ->
     }
 
 
-def _try_model_rewrite(filename: str, content: str, model: str) -> str | None:
-    prompt = (
+def _session() -> aiohttp.ClientSession:
+    return aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=CODE_FIX_TIMEOUT))
+
+
+def _rewrite_prompt(filename: str, content: str) -> str:
+    return (
         "You are an expert software engineer. Fix the following source file. "
         "Correct logic errors (including operator precedence), typos, and formatting issues while preserving style. "
         "Return ONLY the fully corrected code with no commentary or code fences.\n"
@@ -152,17 +571,64 @@ def _try_model_rewrite(filename: str, content: str, model: str) -> str | None:
         "---------"
     )
 
-    payload = {"model": model, "prompt": prompt, "stream": False}
+
+async def _generate_stream(
+    session: aiohttp.ClientSession, model: str, prompt: str, usage: dict | None = None
+) -> AsyncIterator[str]:
+    """
+    Stream response text from Ollama's /api/generate. Falls through to the
+    next host only if nothing was produced yet; raises RuntimeError when no
+    host answers. Token counts from the final chunk are added to `usage`.
+    Holds one of the process-wide model slots for the whole request.
+    """
+    payload = {"model": model, "prompt": prompt, "stream": True}
     errors = []
-    for host in _host_candidates():
-        try:
-            resp = requests.post(f"{host}/api/generate", json=payload, timeout=120)
-            if resp.status_code == 200:
-                data = resp.json()
-                return data.get("response", "")
-            errors.append(f"{host} -> HTTP {resp.status_code}")
-        except Exception as exc:
-            errors.append(f"{host} -> {exc}")
-    if errors:
-        logging.getLogger("code_fix").warning("Model rewrite fallback: %s", "; ".join(errors))
-    return None
+    async with _MODEL_SLOTS:
+        for host in _host_candidates():
+            produced = False
+            try:
+                async with session.post(f"{host}/api/generate", json=payload) as resp:
+                    if resp.status != 200:
+                        errors.append(f"{host} -> HTTP {resp.status}")
+                        continue
+                    async for line in resp.content:
+                        if not line.strip():
+                            continue
+                        try:
+                            data = json.loads(line)
+                        except ValueError:
+                            continue
+                        if data.get("response"):
+                            produced = True
+                            yield data["response"]
+                        if data.get("done"):
+                            if usage is not None:
+                                usage["requests"] += 1
+                                usage["prompt_tokens"] += data.get("prompt_eval_count") or 0
+                                usage["output_tokens"] += data.get("eval_count") or 0
+                            break
+                    return
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                if produced:
+                    raise
+                errors.append(f"{host} -> {exc}")
+    raise RuntimeError("; ".join(errors) or "no Ollama host configured")
+
+
+def _patch_prompt(filename: str, content: str) -> str:
+    return (
+        "You are an expert software engineer. Fix the following source file. "
+        "Correct logic errors (including operator precedence), typos, and formatting issues while preserving style. "
+        "Do NOT return the whole file. Return only the edits, as one or more blocks of exactly this form:\n"
+        "<<<<<<< SEARCH\n"
+        "lines copied exactly from the file\n"
+        "=======\n"
+        "replacement lines\n"
+        ">>>>>>> REPLACE\n"
+        "Each SEARCH section must match the file exactly and only once; include neighbouring lines if needed. "
+        f"If nothing needs fixing, reply {NO_CHANGES}. No commentary or code fences.\n"
+        f"Filename: {filename}\n"
+        "---------\n"
+        f"{content}\n"
+        "---------"
+    )
@@ -0,0 +1,207 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+
+from app.utils import metrics
+from app.utils.disk_cache import TieredCache, content_hash
+
+
+EXTRACT_WORKERS = max(1, int(os.getenv("EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))) or 1))
+# PDFs are split into at most EXTRACT_WORKERS page ranges of at least this
+# many pages and extracted in parallel; every range reparses the file.
+PDF_PAGES_PER_TASK = max(1, int(os.getenv("EXTRACT_PDF_PAGES_PER_TASK", "8") or 8))
+
+_CACHE = TieredCache(
+    os.getenv("EXTRACT_CACHE_DIR", "/app/extract_cache"),
+    memory_items=int(os.getenv("EXTRACT_CACHE_ITEMS", "64") or 64),
+    disk_items=int(os.getenv("EXTRACT_CACHE_DISK_ITEMS", "2000") or 2000),
+)
+# Bumped whenever extraction output changes so stale cache entries are ignored.
+_EXTRACTOR_VERSION = 1
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+
+@dataclass
+class ExtractedPage:
+    number: int
+    text: str
+    start: int
+    end: int
+
+
+@dataclass
+class ExtractedDocument:
+    """
+    Extracted text plus per-page slices. `pages[i].start/end` are offsets into
+    `text`; formats without real pages (DOCX, spreadsheets, plain text) come
+    back as a single page and `page_count` None.
+    """
+    kind: str
+    text: str
+    pages: List[ExtractedPage] = field(default_factory=list)
+    page_count: Optional[int] = None
+
+
+def _kind_for(filename: str) -> str:
+    name = (filename or "").lower()
+    if name.endswith(".pdf"):
+        return "pdf"
+    if name.endswith((".docx", ".doc")):
+        return "docx"
+    if name.endswith((".xlsx", ".xls")):
+        return "excel"
+    if name.endswith(".csv"):
+        return "csv"
+    return "text"
+
+
+# --- worker functions (run in the process pool; must stay module-level) ---
+
+# Uploads are spooled to a temp file once and passed by path, so no task
+# pickles the whole document into the pool.
+
+def _pdf_page_count(path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+
+def _pdf_page_texts(path: str, start: int, stop: int) -> List[str]:
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    return [(reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+
+def _docx_text(path: str) -> str:
+    from docx import Document
+    try:
+        document = Document(path)
+    except Exception as exc:
+        raise ValueError("Unsupported DOC format. Please upload DOCX/PDF/TXT.") from exc
+    return "\n\n".join(p.text for p in document.paragraphs if p.text.strip())
+
+
+def _excel_text(path: str) -> str:
+    from app.utils.excel_reader import Workbook
+    with open(path, "rb") as f:
+        book = Workbook(f.read())
+    try:
+        return "\n\n".join(f"Sheet {name}:\n{df.to_csv(index=False)}" for name, df in book.sheets())
+    finally:
+        book.close()
+
+
+def _csv_text(path: str) -> str:
+    import pandas as pd
+    return pd.read_csv(path).to_csv(index=False)
+
+
+_TEXT_WORKERS = {"docx": _docx_text, "excel": _excel_text, "csv": _csv_text}
+
+
+# --- pool management ---------------------------------------------------------
+
+def _pool() -> ProcessPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            # spawn: forking a process that already runs event-loop threads is unsafe.
+            _POOL = ProcessPoolExecutor(
+                max_workers=EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _POOL
+
+
+def shutdown_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=False, cancel_futures=True)
+            _POOL = None
+
+
+async def _run(fn, *args):
+    global _POOL
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_pool(), fn, *args)
+    except BrokenProcessPool:
+        with _POOL_LOCK:
+            _POOL = None
+        raise
+
+
+def _assemble(kind: str, page_texts: List[str], page_count: Optional[int]) -> ExtractedDocument:
+    pages: List[ExtractedPage] = []
+    parts: List[str] = []
+    offset = 0
+    for number, page_text in enumerate(page_texts, start=1):
+        page_text = page_text.strip()
+        if parts:
+            offset += 2  # "\n\n" separator
+        pages.append(ExtractedPage(number, page_text, offset, offset + len(page_text)))
+        parts.append(page_text)
+        offset += len(page_text)
+    return ExtractedDocument(kind=kind, text="\n\n".join(parts), pages=pages, page_count=page_count)
+
+
+def _write_temp(raw: bytes, suffix: str) -> str:
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+        f.write(raw)
+        return f.name
+
+
+async def _extract_pdf(path: str) -> ExtractedDocument:
+    count = await _run(_pdf_page_count, path)
+    size = max(PDF_PAGES_PER_TASK, math.ceil(count / EXTRACT_WORKERS))
+    ranges = [(i, min(count, i + size)) for i in range(0, count, size)]
+    chunks = await asyncio.gather(*(_run(_pdf_page_texts, path, a, b) for a, b in ranges))
+    return _assemble("pdf", [t for chunk in chunks for t in chunk], count)
+
+
+async def _extract_uncached(kind: str, raw: bytes) -> ExtractedDocument:
+    if kind not in _TEXT_WORKERS and kind != "pdf":
+        return _assemble(kind, [raw.decode("utf-8", errors="ignore")], None)
+    path = await asyncio.to_thread(_write_temp, raw, f".{kind}")
+    try:
+        if kind == "pdf":
+            return await _extract_pdf(path)
+        return _assemble(kind, [await _run(_TEXT_WORKERS[kind], path)], None)
+    finally:
+        await asyncio.to_thread(os.unlink, path)
+
+
+async def extract_document(filename: str, raw: bytes) -> ExtractedDocument:
+    """
+    Extract text from an uploaded PDF/DOCX/XLSX/CSV/text file off the event
+    loop. Parsing runs in a process pool (PDF page ranges in parallel) and
+    results are cached by content hash, so re-uploads skip parsing.
+    Raises ValueError for documents that cannot be parsed.
+    """
+    kind = _kind_for(filename)
+    key = TieredCache.make_key(content_hash(raw), kind, _EXTRACTOR_VERSION)
+    cached, tier = await asyncio.to_thread(_CACHE.get, key)
+    if tier:
+        metrics.incr(f"extract.cache.{tier}_hit")
+        return ExtractedDocument(
+            kind=cached["kind"],
+            text=cached["text"],
+            pages=[ExtractedPage(**p) for p in cached["pages"]],
+            page_count=cached["page_count"],
+        )
+    metrics.incr("extract.cache.miss")
+    if kind == "text":
+        # Decoding is cheaper than a round trip to the pool.
+        doc = _assemble(kind, [raw.decode("utf-8", errors="ignore")], None)
+    else:
+        doc = await _extract_uncached(kind, raw)
+    await asyncio.to_thread(_CACHE.set, key, asdict(doc))
+    return doc
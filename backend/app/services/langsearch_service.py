@@ -1,5 +1,12 @@
+import asyncio
 import os
-import requests
+import re
+import time
+from collections import OrderedDict, deque
+
+import aiohttp
+
+from app.utils import metrics
 
 
 LANGSEARCH_API_URL = os.getenv("LANGSEARCH_API_URL", "https://api.langsearch.ai/v1/web-search")
@@ -9,6 +16,34 @@ LANGSEARCH_API_KEY = os.getenv("LANGSEARCH_API_KEY")
 TAVILY_API_URL = os.getenv("TAVILY_API_URL", "https://api.tavily.com/search")
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
 
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "20") or 20)
+SEARCH_MAX_CONNECTIONS = int(os.getenv("SEARCH_MAX_CONNECTIONS", "20") or 20)
+SEARCH_CACHE_ITEMS = int(os.getenv("SEARCH_CACHE_ITEMS", "512") or 512)
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "1800") or 1800)
+# A cached answer may be at most this fraction of the requested freshness
+# window old, e.g. 6 minutes for "now:1h".
+SEARCH_CACHE_FRESHNESS_FRACTION = float(os.getenv("SEARCH_CACHE_FRESHNESS_FRACTION", "0.1") or 0.1)
+
+# "fallback": secondary only after the primary fails.
+# "hedge": also start the secondary once the primary is slower than its
+#          recent SEARCH_HEDGE_QUANTILE latency; first valid answer wins.
+# "race": query both providers at once.
+SEARCH_MODE = (os.getenv("SEARCH_MODE", "hedge") or "hedge").strip().lower()
+SEARCH_HEDGE_QUANTILE = float(os.getenv("SEARCH_HEDGE_QUANTILE", "0.9") or 0.9)
+SEARCH_HEDGE_DELAY = float(os.getenv("SEARCH_HEDGE_DELAY", "1.5") or 1.5)
+SEARCH_HEDGE_MIN_DELAY = float(os.getenv("SEARCH_HEDGE_MIN_DELAY", "0.2") or 0.2)
+SEARCH_HEDGE_MAX_DELAY = float(os.getenv("SEARCH_HEDGE_MAX_DELAY", "5") or 5)
+SEARCH_HEDGE_MIN_SAMPLES = int(os.getenv("SEARCH_HEDGE_MIN_SAMPLES", "10") or 10)
+SEARCH_LATENCY_WINDOW = int(os.getenv("SEARCH_LATENCY_WINDOW", "200") or 200)
+
+_FRESHNESS_WINDOWS = {
+    "oneday": 86400,
+    "oneweek": 7 * 86400,
+    "onemonth": 30 * 86400,
+    "oneyear": 365 * 86400,
+}
+_UNIT_SECONDS = {"m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
 
 class LangSearchError(Exception):
     """Raised when LangSearch configuration or response is invalid."""
@@ -31,64 +66,253 @@ def _normalize_results(raw_items):
     return normalized
 
 
-def langsearch(query: str, top_k: int = 5, summary: bool = False, freshness: str | None = None) -> list[dict]:
-    if not query:
-        raise LangSearchError("Query cannot be empty")
+class _TTLCache:
+    """Bounded LRU whose entries each carry their own expiry."""
 
-    # 1) Primary: LangSearch
-    if LANGSEARCH_API_KEY:
-        payload = {"query": query, "count": top_k, "summary": summary}
-        if freshness:
-            payload["freshness"] = freshness
-        headers = {
-            "Authorization": f"Bearer {LANGSEARCH_API_KEY}",
-            "Content-Type": "application/json",
-        }
-        try:
-            resp = requests.post(LANGSEARCH_API_URL, json=payload, headers=headers, timeout=20)
-            if resp.status_code < 400:
-                data = resp.json()
-                results = (
-                    data.get("value")
-                    or data.get("results")
-                    or data.get("items")
-                    or data.get("data")
-                    or []
-                )
-                return _normalize_results(results)
-            # fall through to try Tavily if configured
-        except requests.RequestException:
-            # fall through to try Tavily if configured
-            pass
-
-    # 2) Fallback: Tavily (if key configured)
-    if TAVILY_API_KEY:
-        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {TAVILY_API_KEY}"}
-        body = {
-            "query": query,
-            "search_depth": "basic",
-            "include_answer": False,
-            "max_results": max(1, int(top_k)),
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._data: "OrderedDict[tuple, tuple[float, list]]" = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: float):
+        if self.max_items <= 0 or ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_items:
+            self._data.popitem(last=False)
+
+
+class _LatencyWindow:
+    """Latencies of a provider's most recent requests, for quantile estimates."""
+
+    def __init__(self, size: int):
+        self._samples: deque = deque(maxlen=max(1, size))
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> float | None:
+        if len(self._samples) < max(1, SEARCH_HEDGE_MIN_SAMPLES):
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+_CACHE = _TTLCache(SEARCH_CACHE_ITEMS)
+_LATENCY = {
+    "langsearch": _LatencyWindow(SEARCH_LATENCY_WINDOW),
+    "tavily": _LatencyWindow(SEARCH_LATENCY_WINDOW),
+}
+_INFLIGHT: dict = {}
+_SESSION: aiohttp.ClientSession | None = None
+_SESSION_LOOP = None
+
+
+def cache_ttl(freshness: str | None) -> float:
+    """Seconds a result may be reused, shortened for tight freshness windows."""
+    key = (freshness or "").strip().lower()
+    window = _FRESHNESS_WINDOWS.get(key)
+    m = re.fullmatch(r"now:(\d+)([mhdw])", key)
+    if m:
+        window = int(m.group(1)) * _UNIT_SECONDS[m.group(2)]
+    if window is None:
+        return SEARCH_CACHE_TTL
+    return min(SEARCH_CACHE_TTL, window * SEARCH_CACHE_FRESHNESS_FRACTION)
+
+
+def _cache_key(query: str, top_k: int, summary: bool, freshness: str | None) -> tuple:
+    return (" ".join(query.lower().split()), int(top_k), (freshness or "").strip().lower(), bool(summary))
+
+
+async def _session() -> aiohttp.ClientSession:
+    """One pooled client session per event loop (i.e. per worker)."""
+    global _SESSION, _SESSION_LOOP
+    loop = asyncio.get_running_loop()
+    if _SESSION is None or _SESSION.closed or _SESSION_LOOP is not loop:
+        _SESSION = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=SEARCH_MAX_CONNECTIONS, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=SEARCH_TIMEOUT),
+        )
+        _SESSION_LOOP = loop
+    return _SESSION
+
+
+async def close_search_session():
+    global _SESSION
+    if _SESSION is not None and not _SESSION.closed:
+        await _SESSION.close()
+    _SESSION = None
+
+
+async def _langsearch_request(session, query: str, top_k: int, summary: bool, freshness: str | None):
+    payload = {"query": query, "count": top_k, "summary": summary}
+    if freshness:
+        payload["freshness"] = freshness
+    headers = {
+        "Authorization": f"Bearer {LANGSEARCH_API_KEY}",
+        "Content-Type": "application/json",
+    }
+    async with session.post(LANGSEARCH_API_URL, json=payload, headers=headers) as resp:
+        if resp.status >= 400:
+            return None
+        data = await resp.json(content_type=None) or {}
+    results = (
+        data.get("value")
+        or data.get("results")
+        or data.get("items")
+        or data.get("data")
+        or []
+    )
+    return _normalize_results(results)
+
+
+async def _tavily_request(session, query: str, top_k: int):
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {TAVILY_API_KEY}"}
+    body = {
+        "query": query,
+        "search_depth": "basic",
+        "include_answer": False,
+        "max_results": max(1, int(top_k)),
+    }
+    async with session.post(TAVILY_API_URL, json=body, headers=headers) as resp:
+        if resp.status >= 400:
+            return None
+        data = await resp.json(content_type=None) or {}
+    items = data.get("results") or []
+    # Map Tavily results to our normalized schema
+    return [
+        {
+            "title": it.get("title", ""),
+            "url": it.get("url", ""),
+            "snippet": it.get("content", ""),
         }
-        try:
-            resp = requests.post(TAVILY_API_URL, json=body, headers=headers, timeout=20)
-            if resp.status_code < 400:
-                data = resp.json() or {}
-                items = data.get("results") or []
-                # Map Tavily results to our normalized schema
-                mapped = [
-                    {
-                        "title": it.get("title", ""),
-                        "url": it.get("url", ""),
-                        "snippet": it.get("content", ""),
-                    }
-                    for it in items
-                ]
-                return mapped
-        except requests.RequestException:
-            pass
+        for it in items
+    ]
 
-    # If we get here, no provider succeeded.
-    if not LANGSEARCH_API_KEY and not TAVILY_API_KEY:
+
+def hedge_delay(provider: str) -> float:
+    """Seconds to wait on `provider` before hedging with the next one."""
+    observed = _LATENCY[provider].quantile(SEARCH_HEDGE_QUANTILE)
+    if observed is None:
+        observed = SEARCH_HEDGE_DELAY
+    return min(SEARCH_HEDGE_MAX_DELAY, max(SEARCH_HEDGE_MIN_DELAY, observed))
+
+
+async def _call_provider(provider: str, session, query: str, top_k: int, summary: bool, freshness: str | None):
+    """
+    Results from one provider, or None if it failed. Only completed calls feed
+    the latency window; a call cancelled after losing a hedge or race says
+    nothing about how long the provider takes.
+    """
+    started = time.monotonic()
+    try:
+        if provider == "langsearch":
+            results = await _langsearch_request(session, query, top_k, summary, freshness)
+        else:
+            results = await _tavily_request(session, query, top_k)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+        results = None
+    elapsed = time.monotonic() - started
+    if results is None:
+        metrics.incr(f"search.{provider}.error")
+    else:
+        _LATENCY[provider].add(elapsed)
+        metrics.observe(f"search.{provider}", elapsed)
+    return results
+
+
+async def _search_providers(query: str, top_k: int, summary: bool, freshness: str | None) -> list[dict]:
+    providers = [name for name, key in (("langsearch", LANGSEARCH_API_KEY), ("tavily", TAVILY_API_KEY)) if key]
+    if not providers:
         raise LangSearchError("No search provider configured (set LANGSEARCH_API_KEY or TAVILY_API_KEY)")
+    session = await _session()
+
+    if SEARCH_MODE not in ("hedge", "race") or len(providers) == 1:
+        # Primary first (LangSearch), then the fallback (Tavily).
+        for provider in providers:
+            results = await _call_provider(provider, session, query, top_k, summary, freshness)
+            if results is not None:
+                return results
+        raise LangSearchError("All configured search providers are unreachable")
+
+    primary, secondary = providers
+    delay = 0.0 if SEARCH_MODE == "race" else hedge_delay(primary)
+    tasks = {asyncio.create_task(_call_provider(primary, session, query, top_k, summary, freshness)): primary}
+    pending = set(tasks)
+    try:
+        while pending:
+            hedged = len(tasks) > 1
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=None if hedged else delay,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            # Prefer the primary when both finish in the same tick.
+            for task in sorted(done, key=lambda t: providers.index(tasks[t])):
+                if task.result() is not None:
+                    if hedged:
+                        metrics.incr(f"search.hedge.won.{tasks[task]}")
+                    return task.result()
+            if not hedged:
+                # Primary failed or is slower than usual: bring in the secondary.
+                # Race mode starts it straight away, which is not a hedge.
+                if pending and delay > 0:
+                    metrics.incr("search.hedge.fired")
+                task = asyncio.create_task(_call_provider(secondary, session, query, top_k, summary, freshness))
+                tasks[task] = secondary
+                pending.add(task)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+    # If we get here, no provider succeeded.
     raise LangSearchError("All configured search providers are unreachable")
+
+
+def _finish(key: tuple, ttl: float, task: asyncio.Task):
+    _INFLIGHT.pop(key, None)
+    if task.cancelled() or task.exception() is not None:
+        return
+    if task.result():
+        _CACHE.set(key, task.result(), ttl)
+
+
+async def langsearch(query: str, top_k: int = 5, summary: bool = False, freshness: str | None = None) -> list[dict]:
+    """
+    Web search via LangSearch and Tavily (see SEARCH_MODE). Non-empty results are
+    cached per (normalized query, top_k, freshness, summary) for a TTL bounded
+    by the freshness window, and identical concurrent queries share a single
+    provider request.
+    """
+    if not query:
+        raise LangSearchError("Query cannot be empty")
+
+    key = _cache_key(query, top_k, summary, freshness)
+    cached = _CACHE.get(key)
+    if cached is not None:
+        metrics.incr("search.cache.hit")
+        return [dict(r) for r in cached]
+
+    task = _INFLIGHT.get(key)
+    if task is None:
+        metrics.incr("search.cache.miss")
+        task = asyncio.create_task(_search_providers(query, top_k, summary, freshness))
+        _INFLIGHT[key] = task
+        task.add_done_callback(lambda t, key=key, ttl=cache_ttl(freshness): _finish(key, ttl, t))
+    else:
+        metrics.incr("search.cache.coalesced")
+    # Shielded so one caller going away does not cancel the search for the others.
+    results = await asyncio.shield(task)
+    return [dict(r) for r in results]
@@ -2,21 +2,221 @@ import os
 import aiohttp
 import asyncio
 import json
-import base64
+import difflib
+import io
+import re
+from collections import deque
 from fastapi import UploadFile
-from typing import Literal
+from typing import BinaryIO, Iterable, Iterator, List, Literal, Tuple, Union
+from app.services.ollama_service import vision_request_body
+from app.utils.disk_cache import TieredCache, content_hash_file
+from app.utils.image_preprocess import preprocess_image_file, split_into_bands
+from app.utils import metrics
 
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://ollama-dev:11434")
 MODEL_NAME = os.getenv("VISION_MODEL", "aiden_lu/minicpm-v2.6:Q4_K_M")
+# Upper bound on vision-model calls in flight from this process (single and batch).
+OCR_CONCURRENCY = max(1, int(os.getenv("OCR_CONCURRENCY", "2") or 2))
+OCR_PDF_DPI = int(os.getenv("OCR_PDF_DPI", "150") or 150)
+_VISION_SLOTS = asyncio.Semaphore(OCR_CONCURRENCY)
+# Tiled OCR: overlapping full-width bands sized for small-context vision models.
+OCR_TILE_HEIGHT = int(os.getenv("OCR_TILE_HEIGHT", "768") or 768)
+OCR_TILE_OVERLAP = int(os.getenv("OCR_TILE_OVERLAP", "96") or 96)
+OCR_TILE_MAX_WIDTH = int(os.getenv("OCR_TILE_MAX_WIDTH", "1536") or 1536)
 
+# Results keyed by (image content hash, mode, model) so repeated uploads of the
+# same screenshot skip the vision model entirely.
+_OCR_CACHE = TieredCache(
+    os.getenv("OCR_CACHE_DIR", "/app/ocr_cache"),
+    memory_items=int(os.getenv("OCR_CACHE_ITEMS", "256") or 256),
+    disk_items=int(os.getenv("OCR_CACHE_DISK_ITEMS", "10000") or 10000),
+)
 
-async def process_ocr(file: UploadFile, mode: Literal["extract_text", "describe"] = "extract_text") -> str:
+
+async def process_ocr(
+    file: UploadFile,
+    mode: Literal["extract_text", "describe"] = "extract_text",
+    tiled: bool = False,
+) -> dict:
     """
     Performs OCR or image description using an Ollama vision model (llava).
+    Returns {"text": str, "cached": bool}; results are served from the OCR
+    cache when the same image was processed before with the same mode/model.
+    With tiled=True (extract_text only) tall pages are read band by band.
     Falls back to mock output if Ollama isn't reachable.
     """
+    # Work from the spooled upload file; the full image is never read into memory.
+    if tiled and mode == "extract_text":
+        return await ocr_image_tiled(file.file, file.filename)
+    return await ocr_image(file.file, mode, file.filename)
+
+
+ImageSource = Union[bytes, BinaryIO]
+
+
+async def ocr_image_tiled(image: ImageSource, filename: str = "") -> dict:
+    """
+    Text extraction for dense, high-resolution pages: OCR overlapping bands
+    concurrently (each band is cached like a normal image) and merge the text
+    top to bottom, dropping lines repeated across band overlaps.
+    """
+    if not isinstance(image, bytes):
+        image.seek(0)
+    bands = await asyncio.to_thread(
+        split_into_bands, image, OCR_TILE_HEIGHT, OCR_TILE_OVERLAP, OCR_TILE_MAX_WIDTH
+    )
+    if len(bands) <= 1:
+        return await ocr_image(image, "extract_text", filename)
+    results = await asyncio.gather(
+        *(ocr_image(band, "extract_text", f"{filename}#band={i + 1}") for i, band in enumerate(bands))
+    )
+    metrics.incr("ocr.tiled.bands", len(bands))
+    return {
+        "text": merge_band_text([r["text"] for r in results]),
+        "cached": all(r["cached"] for r in results),
+        "tiles": len(bands),
+    }
+
+
+def _norm_line(line: str) -> str:
+    return re.sub(r"\s+", " ", line).strip().lower()
+
+
+def _same_line(a: str, b: str) -> bool:
+    a, b = _norm_line(a), _norm_line(b)
+    if not a or not b:
+        return a == b
+    return a == b or difflib.SequenceMatcher(None, a, b).ratio() >= 0.85
+
+
+def merge_band_text(texts: List[str], max_overlap_lines: int = 6) -> str:
+    """
+    Join per-band OCR output in reading order. Where the tail of the text so
+    far matches the head of the next band (the overlap region read twice),
+    the repeated lines are dropped. Bands that found no text are skipped.
+    """
+    merged: List[str] = []
+    for text in texts:
+        if not text or text.strip().upper() == "NO TEXT FOUND":
+            continue
+        lines = [ln for ln in text.splitlines() if ln.strip()]
+        limit = min(max_overlap_lines, len(merged), len(lines))
+        skip = 0
+        for k in range(limit, 0, -1):
+            if all(_same_line(merged[-k + i], lines[i]) for i in range(k)):
+                skip = k
+                # Keep the fuller reading of each duplicated line.
+                for i in range(k):
+                    if len(lines[i].strip()) > len(merged[-k + i].strip()):
+                        merged[-k + i] = lines[i]
+                break
+        if not skip and merged and lines:
+            # A line cut by the band edge is read partially by one band and
+            # fully by the other; keep only the complete reading.
+            head, tail = _norm_line(lines[0]), _norm_line(merged[-1])
+            if len(head) >= 8 and head in tail:
+                skip = 1
+            elif len(tail) >= 8 and tail in head:
+                merged.pop()
+        merged.extend(lines[skip:])
+    return "\n".join(merged) if merged else "NO TEXT FOUND"
+
+
+async def ocr_image(image: ImageSource, mode: str = "extract_text", filename: str = "") -> dict:
+    """OCR/describe one image (bytes or binary file object), consulting the cache first."""
+    if isinstance(image, bytes):
+        image = io.BytesIO(image)
+    digest = await asyncio.to_thread(content_hash_file, image)
+    cache_key = TieredCache.make_key(digest, mode, MODEL_NAME)
+    cached, tier = await asyncio.to_thread(_OCR_CACHE.get, cache_key)
+    if tier:
+        metrics.incr(f"ocr.cache.{tier}_hit")
+        return {"text": cached, "cached": True}
+    metrics.incr("ocr.cache.miss")
+
+    text = await _run_ocr(image, mode)
+    if text is not None:
+        await asyncio.to_thread(_OCR_CACHE.set, cache_key, text)
+        return {"text": text, "cached": False}
+    return {"text": _mock_ocr_result(filename, mode), "cached": False}
+
+
+async def ocr_batch(pages: Iterable[Tuple[str, ImageSource]], mode: str = "extract_text"):
+    """
+    OCR a sequence of (source label, image bytes) pages and yield one result
+    dict per page in input order.
+
+    Pages are pulled from `pages` lazily and at most 2 * OCR_CONCURRENCY are
+    held at once, so memory stays flat regardless of document length. Pages
+    beyond the front of the window keep running while earlier ones finish.
+    """
+    it = iter(pages)
+    window: deque = deque()
+    window_size = OCR_CONCURRENCY * 2
+    index = 0
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(window) < window_size:
+                item = await asyncio.to_thread(next, it, None)
+                if item is None:
+                    exhausted = True
+                    break
+                index += 1
+                source, data = item
+                window.append((index, source, asyncio.create_task(ocr_image(data, mode, source))))
+            if not window:
+                return
+            page, source, task = window.popleft()
+            try:
+                result = await task
+                yield {"page": page, "source": source, **result}
+            except Exception as exc:
+                yield {"page": page, "source": source, "error": str(exc)}
+    finally:
+        for _, _, task in window:
+            task.cancel()
+
+
+def iter_upload_pages(files: List[Tuple[str, BinaryIO]]) -> Iterator[Tuple[str, ImageSource]]:
+    """
+    Yield (label, image) for each uploaded file, rasterizing PDFs one page at
+    a time. Plain images are passed through as their (rewound) file objects.
+    `files` holds (filename, binary file object) pairs.
+    """
+    for filename, fh in files:
+        name = (filename or "").lower()
+        fh.seek(0)
+        if name.endswith(".pdf"):
+            yield from _rasterize_pdf(filename, fh)
+        else:
+            yield filename, fh
+
+
+def _rasterize_pdf(filename: str, fh) -> Iterator[Tuple[str, bytes]]:
+    try:
+        import pypdfium2 as pdfium
+    except ImportError as exc:
+        raise RuntimeError("PDF OCR requires pypdfium2") from exc
+    pdf = pdfium.PdfDocument(fh)
+    try:
+        for i in range(len(pdf)):
+            page = pdf[i]
+            try:
+                image = page.render(scale=OCR_PDF_DPI / 72).to_pil()
+            finally:
+                page.close()
+            out = io.BytesIO()
+            image.save(out, format="PNG")
+            yield f"{filename}#page={i + 1}", out.getvalue()
+    finally:
+        pdf.close()
+
+
+async def _run_ocr(image: BinaryIO, mode: str) -> str | None:
+    """Call the vision model; returns None when Ollama is unreachable."""
     try:
-        file_bytes = await file.read()
+        prepared = await asyncio.to_thread(preprocess_image_file, image, mode)
 
         # Try real OCR via Ollama REST API
         try:
@@ -30,14 +230,12 @@ async def process_ocr(file: UploadFile, mode: Literal["extract_text", "describe"
                     )
                 else:
                     prompt = "Describe this image in detail."
-                encoded = base64.b64encode(file_bytes).decode("utf-8")
-                data = {
-                    "model": MODEL_NAME,
-                    "prompt": prompt,
-                    "stream": False,
-                    "images": [encoded],
-                }
-                async with session.post(f"{OLLAMA_HOST}/api/generate", json=data) as resp:
+                body = vision_request_body(MODEL_NAME, prompt, prepared)
+                async with _VISION_SLOTS, session.post(
+                    f"{OLLAMA_HOST}/api/generate",
+                    data=body,
+                    headers={"Content-Type": "application/json"},
+                ) as resp:
                     if resp.status != 200:
                         raise Exception(f"Ollama returned {resp.status}")
                     raw = await resp.text()
@@ -57,7 +255,10 @@ async def process_ocr(file: UploadFile, mode: Literal["extract_text", "describe"
             # Ollama not available → fallback to mock
             print(f"[OCR Service] Ollama not reachable: {ollama_error}")
             await asyncio.sleep(0.2)
-            return _mock_ocr_result(file.filename, mode)
+            return None
+        finally:
+            if prepared is not image:
+                prepared.close()
 
     except Exception as e:
         raise Exception(f"OCR processing failed: {e}")
@@ -1,4 +1,4 @@
-import aiohttp, os, base64, requests, time, threading
+import aiohttp, os, base64, json, requests, time, threading
 
 
 # Prefer docker service hostname so containers can talk without extra env.
@@ -83,6 +83,34 @@ async def embeddings(model: str, text: str):
 def encode_image(b: bytes) -> str:
     return base64.b64encode(b).decode("utf-8")
 
+
+# Multiple of 3 so independently encoded chunks concatenate into valid base64.
+_B64_CHUNK = 3 * 64 * 1024
+
+
+async def vision_request_body(model: str, prompt: str, image, extra: dict | None = None):
+    """
+    Yield a /api/generate JSON body with one base64 image, encoding the image
+    from a binary file object chunk by chunk. Peak memory per request is a
+    couple of chunks instead of the raw bytes + base64 string + dict + JSON.
+    Pass as `data=` to aiohttp with a JSON content type.
+    """
+    head = {"model": model, "prompt": prompt, "stream": False, **(extra or {})}
+    yield (json.dumps(head)[:-1] + ', "images": ["').encode("utf-8")
+    image.seek(0)
+    carry = b""
+    while True:
+        block = image.read(_B64_CHUNK)
+        if not block:
+            break
+        block = carry + block
+        cut = len(block) - len(block) % 3
+        carry = block[cut:]
+        yield base64.b64encode(block[:cut])
+    if carry:
+        yield base64.b64encode(carry)
+    yield b'"]}'
+
 def list_models():
     """
     Returns a list of locally available Ollama models.
@@ -1,18 +1,34 @@
 import asyncio
-import io
 import json
 import math
 import os
-import zipfile
-from typing import Tuple
+import re
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, List, Tuple
 
 import aiohttp
-from pypdf import PdfReader
+
+from app.services.extraction_service import extract_document
+from app.utils import metrics
+from app.utils.disk_cache import TieredCache, content_hash
+from app.utils.language_detect import is_language
 
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://ollama-dev:11434")
 TRANSLATION_MODEL = os.getenv("TRANSLATION_MODEL", "llama3:8b")
 MAX_BYTES = 20 * 1024 * 1024  # 20 MB
-MAX_PAGES = 10
+# Segments are translated concurrently, so page count is a throughput knob
+# rather than a prompt-size limit.
+MAX_PAGES = int(os.getenv("TRANSLATION_MAX_PAGES", "50") or 50)
+# ~600 tokens per segment keeps prompts well inside llama3's context.
+SEGMENT_CHARS = int(os.getenv("TRANSLATION_SEGMENT_CHARS", "2400") or 2400)
+TRANSLATION_CONCURRENCY = max(1, int(os.getenv("TRANSLATION_CONCURRENCY", "3") or 3))
+# How the summary overlaps translation:
+#   sequential - summarize the finished translation (original behaviour)
+#   pipelined  - summarize groups of translated segments while later ones translate
+#   source     - summarize the source text alongside the translation
+SUMMARY_MODES = ("sequential", "pipelined", "source")
+SUMMARY_MODE = os.getenv("TRANSLATION_SUMMARY_MODE", "pipelined")
 
 
 async def _ollama_generate(session, prompt: str) -> str:
@@ -29,71 +45,362 @@ async def _ollama_generate(session, prompt: str) -> str:
         return response.strip()
 
 
-def _extract_docx_text(content_bytes: bytes) -> str:
-    with zipfile.ZipFile(io.BytesIO(content_bytes)) as docx:
-        with docx.open("word/document.xml") as doc_xml:
-            from xml.etree import ElementTree as ET
+def _estimate_pages_from_text(text: str) -> int:
+    chars_per_page = 1800
+    return max(1, math.ceil(len(text) / chars_per_page))
 
-            tree = ET.parse(doc_xml)
-            return "".join(tree.itertext()).strip()
 
+_SENTENCE_END = re.compile(r"(?<=[.!?。！？؟])\s+|\n+")
 
-def _extract_pdf_text(content_bytes: bytes) -> Tuple[str, int]:
-    reader = PdfReader(io.BytesIO(content_bytes))
-    pages = len(reader.pages)
-    text_parts = [(page.extract_text() or "") for page in reader.pages]
-    return "\n".join(text_parts).strip(), pages
 
+def _split_long(unit: str, budget: int) -> List[str]:
+    """Break an over-long paragraph at sentence/line ends, hard-cutting as a last resort."""
+    pieces: List[str] = []
+    current = ""
+    for sentence in _SENTENCE_END.split(unit):
+        if not sentence:
+            continue
+        while len(sentence) > budget:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:budget])
+            sentence = sentence[budget:]
+        if current and len(current) + 1 + len(sentence) > budget:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
 
-def _estimate_pages_from_text(text: str) -> int:
-    chars_per_page = 1800
-    return max(1, math.ceil(len(text) / chars_per_page))
+
+def split_segments(text: str, budget: int = SEGMENT_CHARS) -> List[str]:
+    """
+    Split text into translation segments of at most `budget` characters,
+    packing whole paragraphs together where possible so each prompt carries
+    enough context. Segments are later rejoined with blank lines.
+    """
+    segments: List[str] = []
+    current = ""
+    for para in re.split(r"\n\s*\n", text):
+        para = para.strip()
+        if not para:
+            continue
+        units = [para] if len(para) <= budget else _split_long(para, budget)
+        for unit in units:
+            if current and len(current) + 2 + len(unit) > budget:
+                segments.append(current)
+                current = unit
+            else:
+                current = f"{current}\n\n{unit}" if current else unit
+    if current:
+        segments.append(current)
+    return segments
+
+
+# Translation memory: (normalized source paragraph, target language, model) -> translation.
+# Runs of paragraphs the model merged or re-split are stored under the whole
+# run's text instead, since they cannot be split back into paragraphs.
+_TM = TieredCache(
+    os.getenv("TRANSLATION_MEMORY_DIR", "/app/translation_memory"),
+    memory_items=int(os.getenv("TRANSLATION_MEMORY_ITEMS", "2048") or 2048),
+    disk_items=int(os.getenv("TRANSLATION_MEMORY_DISK_ITEMS", "100000") or 100000),
+)
+
+
+def _tm_key(source: str, target_language: str) -> str:
+    normalized = re.sub(r"\s+", " ", source).strip()
+    return TieredCache.make_key(content_hash(normalized.encode("utf-8")), target_language.strip().lower(), TRANSLATION_MODEL)
 
 
-async def process_translation(file, target_language: str = "English") -> dict:
+def new_translation_stats() -> dict:
+    return {
+        "paragraphs": 0, "reused": 0, "chars": 0, "reused_chars": 0,
+        "already_in_target": 0, "generations": 0, "generations_avoided": 0,
+        "generations_added": 0,
+    }
+
+
+def _resolve_known(paragraphs: List[str], target_language: str) -> List[Tuple[str | None, str | None]]:
     """
-    Translate uploaded text/PDF/DOCX into the target language and summarize in English.
-    Enforces file size (<=20MB) and length (<=10 pages) limits.
+    For each paragraph return (translation, source) when no model call is
+    needed: ("<paragraph>", "target") if it already reads as the target
+    language (or has no letters), (tm_text, "memory") on a translation-memory
+    hit, else (None, None).
+    """
+    known: List[Tuple[str | None, str | None]] = []
+    for p in paragraphs:
+        if is_language(p, target_language):
+            known.append((p, "target"))
+            continue
+        hit = _tm_lookup(p, target_language)
+        known.append((hit, "memory") if hit is not None else (None, None))
+    return known
+
+
+def _tm_lookup(source: str, target_language: str) -> str | None:
+    return _TM.get(_tm_key(source, target_language))[0]
+
+
+def _tm_store(pairs: List[Tuple[str, str]], target_language: str) -> None:
+    for source, translated in pairs:
+        _TM.set(_tm_key(source, target_language), translated)
+
+
+async def _translate_segment(session, segment: str, target_language: str, stats: dict) -> str:
+    """
+    Translate one segment paragraph by paragraph. Paragraphs already in the
+    target language pass through untouched and paragraphs in the translation
+    memory are reused; each contiguous run of the remaining paragraphs is
+    translated in one prompt. Results are remembered per paragraph when the
+    model keeps the paragraph count, and per run otherwise (runs are looked
+    up as a whole before they are sent to the model).
+
+    Without the memory a segment costs one generation. Segments served
+    entirely from memory count as generations_avoided; segments split into
+    several runs by remembered paragraphs count the extra calls as
+    generations_added.
+    """
+    paragraphs = segment.split("\n\n")
+    known = await asyncio.to_thread(_resolve_known, paragraphs, target_language)
+    out: List[str | None] = [text for text, _ in known]
+    stats["paragraphs"] += len(paragraphs)
+    stats["chars"] += sum(len(p) for p in paragraphs)
+    for p, (_, source) in zip(paragraphs, known):
+        if source == "memory":
+            stats["reused"] += 1
+            stats["reused_chars"] += len(p)
+        elif source == "target":
+            stats["already_in_target"] += 1
+    metrics.incr("translation.memory.hit", sum(1 for _, src in known if src == "memory"))
+    metrics.incr("translation.lang_skip.paragraphs", sum(1 for _, src in known if src == "target"))
+
+    runs: List[Tuple[int, int]] = []
+    i = 0
+    while i < len(paragraphs):
+        if out[i] is None:
+            j = i
+            while j < len(paragraphs) and out[j] is None:
+                j += 1
+            runs.append((i, j))
+            i = j
+        else:
+            i += 1
+
+    calls = 0
+    for start, stop in runs:
+        run = paragraphs[start:stop]
+        source = "\n\n".join(run)
+        translated = await asyncio.to_thread(_tm_lookup, source, target_language) if len(run) > 1 else None
+        if translated is not None:
+            stats["reused"] += len(run)
+            stats["reused_chars"] += sum(len(p) for p in run)
+            metrics.incr("translation.memory.hit", len(run))
+        else:
+            metrics.incr("translation.memory.miss", len(run))
+            prompt = (
+                f"Translate the following text to {target_language}. "
+                "Return only the translation, preserving paragraph breaks:\n\n"
+                f"{source}"
+            )
+            translated = await _ollama_generate(session, prompt)
+            calls += 1
+            pieces = [t.strip() for t in re.split(r"\n\s*\n", translated) if t.strip()]
+            pairs = list(zip(run, pieces)) if len(pieces) == len(run) else [(source, translated)]
+            await asyncio.to_thread(_tm_store, pairs, target_language)
+        out[start] = translated
+        for k in range(start + 1, stop):
+            out[k] = ""
+
+    stats["generations"] += calls
+    if calls == 0:
+        stats["generations_avoided"] += 1
+        metrics.incr("translation.generations_avoided")
+    elif calls > 1:
+        stats["generations_added"] += calls - 1
+        metrics.incr("translation.generations_added", calls - 1)
+    return "\n\n".join(t for t in out if t)
+
+
+async def translate_segments(
+    session,
+    segments: List[str],
+    target_language: str,
+    stats: dict | None = None,
+    slots: asyncio.Semaphore | None = None,
+) -> AsyncIterator[str]:
+    """
+    Translate segments concurrently (at most TRANSLATION_CONCURRENCY segments
+    at once, or as many as `slots` allows when a shared semaphore is given)
+    and yield the translations in source order. Reuse counts from the
+    translation memory are accumulated into `stats` when given.
+    """
+    slots = slots or asyncio.Semaphore(TRANSLATION_CONCURRENCY)
+    stats = stats if stats is not None else new_translation_stats()
+
+    async def one(segment: str) -> str:
+        async with slots:
+            return await _translate_segment(session, segment, target_language, stats)
+
+    tasks = [asyncio.create_task(one(seg)) for seg in segments]
+    try:
+        for task in tasks:
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def summarize_hierarchical(
+    session,
+    parts: List[str],
+    budget: int = SEGMENT_CHARS * 2,
+    depth: int = 0,
+    slots: asyncio.Semaphore | None = None,
+) -> str:
+    """
+    Summarize text given as ordered parts. When the parts do not fit one
+    prompt, groups are summarized concurrently and the partial summaries are
+    summarized again until a single prompt suffices (at most three levels).
+    Every model call holds one of `slots` (TRANSLATION_CONCURRENCY by default).
+    """
+    slots = slots or asyncio.Semaphore(TRANSLATION_CONCURRENCY)
+    if sum(len(p) for p in parts) <= budget or depth >= 3:
+        summarize_prompt = (
+            "Summarize the following text in English, keeping key facts:\n\n"
+            + "\n\n".join(parts)
+        )
+        async with slots:
+            return await _ollama_generate(session, summarize_prompt)
+
+    groups = split_segments("\n\n".join(parts), budget)
+    partials = await asyncio.gather(*(_summarize_part(session, g, slots) for g in groups))
+    return await summarize_hierarchical(session, list(partials), budget, depth + 1, slots)
+
+
+async def _summarize_part(session, text: str, slots: asyncio.Semaphore) -> str:
+    async with slots:
+        return await _ollama_generate(
+            session,
+            "Summarize this part of a longer document in English, keeping key facts, names and figures:\n\n"
+            f"{text}",
+        )
+
+
+async def translate_and_summarize(
+    session,
+    segments: List[str],
+    target_language: str,
+    stats: dict,
+    timings: dict,
+    mode: str = SUMMARY_MODE,
+) -> AsyncIterator[Tuple[str, str]]:
     """
+    Run translation and summarization as configured by `mode` (see
+    SUMMARY_MODES), yielding ("segment", text) for each translated segment in
+    order and finally ("summary", text). Stage durations in seconds are
+    written to `timings`: translate, summary_tail (time from the last
+    segment to the finished summary) and total.
+
+    Translation and summary calls share one semaphore, so a request never
+    has more than TRANSLATION_CONCURRENCY model calls in flight. An unknown
+    `mode` falls back to the configured SUMMARY_MODE.
+    """
+    if mode not in SUMMARY_MODES:
+        mode = SUMMARY_MODE if SUMMARY_MODE in SUMMARY_MODES else "pipelined"
+    slots = asyncio.Semaphore(TRANSLATION_CONCURRENCY)
+    started = time.perf_counter()
+    budget = SEGMENT_CHARS * 2
+    source_task = None
+    partial_tasks: List[asyncio.Task] = []
+    buffer: List[str] = []
+    translated: List[str] = []
+    if mode == "source":
+        source_task = asyncio.create_task(summarize_hierarchical(session, segments, slots=slots))
+    try:
+        async with aclosing(translate_segments(session, segments, target_language, stats, slots)) as pending:
+            async for text in pending:
+                translated.append(text)
+                if mode == "pipelined":
+                    buffer.append(text)
+                    if sum(len(b) for b in buffer) >= budget:
+                        partial_tasks.append(asyncio.create_task(_summarize_part(session, "\n\n".join(buffer), slots)))
+                        buffer = []
+                yield "segment", text
+        translated_at = time.perf_counter()
+        timings["translate"] = round(translated_at - started, 3)
+
+        if mode == "source":
+            summary = await source_task
+        elif mode == "pipelined" and partial_tasks:
+            if buffer:
+                partial_tasks.append(asyncio.create_task(_summarize_part(session, "\n\n".join(buffer), slots)))
+            partials = await asyncio.gather(*partial_tasks)
+            summary = await summarize_hierarchical(session, list(partials), slots=slots)
+        else:
+            summary = await summarize_hierarchical(session, translated, slots=slots)
+        done_at = time.perf_counter()
+        timings["summary_tail"] = round(done_at - translated_at, 3)
+        timings["total"] = round(done_at - started, 3)
+        timings["mode"] = mode
+        for stage in ("translate", "summary_tail", "total"):
+            metrics.observe(f"translation.{mode}.{stage}", timings[stage])
+        yield "summary", summary
+    finally:
+        for task in partial_tasks + ([source_task] if source_task else []):
+            task.cancel()
+
+
+async def _read_document(file) -> str:
+    """Read and extract an uploaded document, enforcing size and page limits."""
     content_bytes = await file.read()
     if len(content_bytes) > MAX_BYTES:
         raise Exception("Uploaded file exceeds 20MB limit")
 
-    filename = (file.filename or "").lower()
-    content = ""
-    page_count = 1
-
-    if filename.endswith(".pdf"):
-        content, page_count = _extract_pdf_text(content_bytes)
-    elif filename.endswith(".docx"):
-        content = _extract_docx_text(content_bytes)
-        page_count = _estimate_pages_from_text(content)
-    else:
-        content = content_bytes.decode("utf-8", errors="ignore").strip()
-        page_count = _estimate_pages_from_text(content)
+    document = await extract_document(file.filename, content_bytes)
+    content = document.text.strip()
+    page_count = document.page_count or _estimate_pages_from_text(content)
 
     if not content:
         raise Exception("Uploaded file is empty")
     if page_count > MAX_PAGES:
-        raise Exception("Document exceeds 10 page limit")
+        raise Exception(f"Document exceeds {MAX_PAGES} page limit")
+    return content
+
+
+async def process_translation(file, target_language: str = "English", summary_mode: str | None = None) -> dict:
+    """
+    Translate uploaded text/PDF/DOCX into the target language and summarize in English.
+    The document is split into segments that are translated concurrently and
+    reassembled in order; the summary is built from the translated segments.
+    Enforces file size (<=20MB) and length (<=MAX_PAGES) limits.
+    """
+    content = await _read_document(file)
 
     try:
         async with aiohttp.ClientSession() as session:
-            translate_prompt = (
-                f"Translate the following text to {target_language}:\n\n{content}"
-            )
-            translation = await _ollama_generate(session, translate_prompt)
-
-            summarize_prompt = (
-                "Summarize the following text in English, keeping key facts:\n\n"
-                f"{translation}"
-            )
-            summary = await _ollama_generate(session, summarize_prompt)
+            segments = split_segments(content)
+            stats = new_translation_stats()
+            timings: dict = {}
+            translated: List[str] = []
+            summary = ""
+            async for kind, text in translate_and_summarize(
+                session, segments, target_language, stats, timings, summary_mode or SUMMARY_MODE
+            ):
+                if kind == "segment":
+                    translated.append(text)
+                else:
+                    summary = text
 
             return {
                 "original": content,
-                "translation": translation,
+                "translation": "\n\n".join(translated),
                 "summary": summary,
+                "segments": len(segments),
+                "reuse": stats,
+                "timings": timings,
             }
 
     except Exception as ollama_error:
@@ -104,3 +411,54 @@ async def process_translation(file, target_language: str = "English") -> dict:
             "translation": "[Mock Translation] English version of uploaded text.",
             "summary": "[Mock Summary] This is a concise summary of the translated text.",
         }
+
+
+async def stream_translation(
+    file, target_language: str = "English", summary_mode: str | None = None
+) -> AsyncIterator[dict]:
+    """
+    Streaming variant of process_translation. Yields events in this order:
+    {"type": "meta", "segments": n, "original": ...}, one
+    {"type": "segment", "index": i, "text": ...} per segment in source order
+    as soon as it and all earlier segments are translated, then
+    {"type": "summary", "text": ...} and {"type": "done", "reuse": {...},
+    "timings": {...}}; or
+    {"type": "error", "detail": ...} if the model fails midway.
+
+    Closing the generator (e.g. on client disconnect) cancels every pending
+    model call; streams that stop before their done or error event are
+    counted as translation.stream_cancelled. Time to first segment is
+    recorded in metrics.
+    """
+    content = await _read_document(file)
+    segments = split_segments(content)
+    started = time.perf_counter()
+    finished = False
+    try:
+        yield {"type": "meta", "segments": len(segments), "original": content}
+        async with aiohttp.ClientSession() as session:
+            index = 0
+            stats = new_translation_stats()
+            timings: dict = {}
+            events = translate_and_summarize(
+                session, segments, target_language, stats, timings, summary_mode or SUMMARY_MODE
+            )
+            async with aclosing(events):
+                async for kind, text in events:
+                    if kind == "summary":
+                        yield {"type": "summary", "text": text}
+                        continue
+                    if index == 0:
+                        metrics.observe("translation.time_to_first_segment", time.perf_counter() - started)
+                    yield {"type": "segment", "index": index, "text": text}
+                    index += 1
+        metrics.observe("translation.stream_total", time.perf_counter() - started)
+        finished = True
+        yield {"type": "done", "reuse": stats, "timings": timings}
+    except Exception as ollama_error:
+        print(f"[Translation Service] Ollama not reachable: {ollama_error}")
+        finished = True
+        yield {"type": "error", "detail": f"Translation model unavailable: {ollama_error}"}
+    finally:
+        if not finished:
+            metrics.incr("translation.stream_cancelled")
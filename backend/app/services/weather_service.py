@@ -1,8 +1,17 @@
+import asyncio
+import functools
+import json
 import os
+import re
 import time
-import threading
-from typing import Optional, Dict, Any, List
-import requests
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+
+from app.utils import metrics
+from app.utils.disk_cache import TieredCache
+from app.utils.gazetteer import Gazetteer, normalize_place
 
 
 TOMORROW_API_KEY = os.getenv("TOMORROW_API_KEY")
@@ -12,6 +21,24 @@ WEATHER_GEOCODE_FALLBACK = (os.getenv("WEATHER_GEOCODE_FALLBACK", "true").lower(
 GEOCODE_URL = os.getenv("GEOCODE_URL", "https://geocode.maps.co/search")
 OPENMETEO_URL = os.getenv("OPENMETEO_URL", "https://api.open-meteo.com/v1/forecast")
 OPENMETEO_GEOCODE_URL = os.getenv("OPENMETEO_GEOCODE_URL", "https://geocoding-api.open-meteo.com/v1/search")
+WEATHER_MAX_CONNECTIONS = int(os.getenv("WEATHER_MAX_CONNECTIONS", "20") or 20)
+WEATHER_GAZETTEER_PATH = os.getenv(
+    "WEATHER_GAZETTEER_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "gazetteer.tsv"),
+)
+
+# Geocoder answers by normalized place name; places rarely move, so no TTL.
+_GEOCODE_CACHE = TieredCache(
+    os.getenv("GEOCODE_CACHE_DIR", "/app/geocode_cache"),
+    memory_items=int(os.getenv("GEOCODE_CACHE_ITEMS", "1024") or 1024),
+    disk_items=int(os.getenv("GEOCODE_CACHE_DISK_ITEMS", "50000") or 50000),
+)
+_TIME_WORDS = re.compile(
+    r"\b(?:today|now|tonight|tomorrow|this\s+(?:morning|afternoon|evening|week|weekend))\b\s*$",
+    re.IGNORECASE,
+)
+
+_HTTP_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
 
 
 class WeatherError(Exception):
@@ -24,40 +51,165 @@ def _units_labels(units: str) -> Dict[str, str]:
     return {"temp": "°C", "speed": "km/h"}
 
 
-# --- Simple in-process TTL cache (per container) ---
+# --- In-process weather cache (per worker) ---
 _CACHE_TTL = int(os.getenv("WEATHER_CACHE_SECONDS", "180") or 180)
-_CACHE: Dict[tuple, tuple] = {}
-_CACHE_LOCK = threading.Lock()
+# After the TTL, entries are still served for this long while a refresh runs.
+_CACHE_STALE = int(os.getenv("WEATHER_CACHE_STALE_SECONDS", "900") or 900)
+_CACHE_ITEMS = int(os.getenv("WEATHER_CACHE_ITEMS", "2048") or 2048)
+# Popular entries (read WEATHER_REFRESH_AHEAD_HITS times since their last
+# fetch) are refreshed once they enter the last WEATHER_REFRESH_AHEAD
+# fraction of their TTL, so readers rarely see them expire.
+_REFRESH_AHEAD = float(os.getenv("WEATHER_REFRESH_AHEAD", "0.2") or 0.2)
+_REFRESH_AHEAD_HITS = int(os.getenv("WEATHER_REFRESH_AHEAD_HITS", "3") or 3)
 
 
-def _cache_get(key: tuple):
-    if _CACHE_TTL <= 0:
-        return None
-    now = time.time()
-    with _CACHE_LOCK:
-        entry = _CACHE.get(key)
-        if not entry:
-            return None
-        expiry, value = entry
-        if now >= expiry:
-            # expired
-            try:
-                del _CACHE[key]
-            except KeyError:
-                pass
-            return None
-        return value
+class _Entry:
+    __slots__ = ("value", "fresh_until", "stale_until", "hits")
+
+    def __init__(self, value, fresh_until: float, stale_until: float):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+        self.hits = 0
+
+
+class _WeatherCache:
+    """
+    Bounded LRU of upstream results with stale-while-revalidate. A fresh
+    entry is served as is; an entry past its TTL but within the stale window
+    is served while one background task refreshes it; anything older is a
+    miss. Each key has at most one fetch in flight, shared by every caller
+    that needs it. Failed background refreshes keep the stale value.
+    """
+
+    def __init__(self, max_items: int, ttl: float, stale: float, refresh_ahead: float, refresh_ahead_hits: int):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.stale = max(0.0, stale)
+        self.refresh_ahead = refresh_ahead
+        self.refresh_ahead_hits = refresh_ahead_hits
+        self._data: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+
+    async def get(self, key: tuple, fetch: Callable[[], Awaitable[Any]]):
+        if self.ttl <= 0 or self.max_items <= 0:
+            return await fetch()
+        now = time.monotonic()
+        entry = self._data.get(key)
+        if entry is not None and now < entry.stale_until:
+            self._data.move_to_end(key)
+            entry.hits += 1
+            if now >= entry.fresh_until:
+                metrics.incr("weather.cache.stale")
+                self._refresh(key, fetch)
+            else:
+                metrics.incr("weather.cache.hit")
+                if (
+                    entry.hits >= self.refresh_ahead_hits
+                    and entry.fresh_until - now <= self.ttl * self.refresh_ahead
+                    and key not in self._inflight
+                ):
+                    metrics.incr("weather.cache.refresh_ahead")
+                    self._refresh(key, fetch)
+            return entry.value
+        metrics.incr("weather.cache.coalesced" if key in self._inflight else "weather.cache.miss")
+        # Shielded so a caller going away does not cancel the fetch for the others.
+        return await asyncio.shield(self._refresh(key, fetch))
+
+    def _refresh(self, key: tuple, fetch) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(fetch())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._finish(key, t))
+        return task
+
+    def _finish(self, key: tuple, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            metrics.incr("weather.cache.fetch_error")
+            return
+        now = time.monotonic()
+        self._data[key] = _Entry(task.result(), now + self.ttl, now + self.ttl + self.stale)
+        self._data.move_to_end(key)
+        # Drop least recently used entries beyond the bound, and any that
+        # are past their stale window at the cold end of the LRU.
+        while self._data:
+            oldest = next(iter(self._data.values()))
+            if len(self._data) <= self.max_items and oldest.stale_until > now:
+                break
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_CACHE = _WeatherCache(_CACHE_ITEMS, _CACHE_TTL, _CACHE_STALE, _REFRESH_AHEAD, _REFRESH_AHEAD_HITS)
+
+
+_SESSION: aiohttp.ClientSession | None = None
+_SESSION_LOOP = None
+_GEOCODE_INFLIGHT: Dict[str, asyncio.Task] = {}
+
+
+async def _session() -> aiohttp.ClientSession:
+    """One pooled client session per event loop (i.e. per worker)."""
+    global _SESSION, _SESSION_LOOP
+    loop = asyncio.get_running_loop()
+    if _SESSION is None or _SESSION.closed or _SESSION_LOOP is not loop:
+        _SESSION = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=WEATHER_MAX_CONNECTIONS, ttl_dns_cache=300),
+        )
+        _SESSION_LOOP = loop
+    return _SESSION
+
+
+async def close_weather_session():
+    global _SESSION
+    if _SESSION is not None and not _SESSION.closed:
+        await _SESSION.close()
+    _SESSION = None
 
 
-def _cache_set(key: tuple, value):
-    if _CACHE_TTL <= 0:
-        return
-    expiry = time.time() + _CACHE_TTL
-    with _CACHE_LOCK:
-        _CACHE[key] = (expiry, value)
+class _Response:
+    def __init__(self, status: int, text: str):
+        self.status_code = status
+        self.text = text
 
+    def json(self):
+        return json.loads(self.text) if self.text else None
 
-def realtime(location: str, units: Optional[str] = None) -> Dict[str, Any]:
+
+async def _get(url: str, params: Dict[str, Any], timeout: float = 8) -> _Response:
+    """GET with the shared session; list params are sent comma-separated."""
+    query = {k: ",".join(map(str, v)) if isinstance(v, (list, tuple)) else str(v) for k, v in params.items()}
+    session = await _session()
+    async with session.get(url, params=query, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+        return _Response(resp.status, await resp.text())
+
+
+def _realtime_result(data: Dict[str, Any], location: str, units: str) -> Dict[str, Any]:
+    values = (data.get("data") or {}).get("values") or {}
+    return {
+        "location": location,
+        "observed_at": (data.get("data") or {}).get("time"),
+        "units": units,
+        "temperature": values.get("temperature"),
+        "temperatureApparent": values.get("temperatureApparent"),
+        "humidity": values.get("humidity"),
+        "windSpeed": values.get("windSpeed"),
+        "weatherCode": values.get("weatherCode"),
+        "precipitationIntensity": values.get("rainIntensity") or values.get("precipitationIntensity"),
+        "uvIndex": values.get("uvIndex"),
+        "visibility": values.get("visibility"),
+        "labels": _units_labels(units),
+        "raw": data,
+    }
+
+
+async def realtime(location: str, units: Optional[str] = None) -> Dict[str, Any]:
     """
     Fetch current conditions from Tomorrow.io Realtime API.
 
@@ -74,92 +226,52 @@ def realtime(location: str, units: Optional[str] = None) -> Dict[str, Any]:
 
     use_units = (units or TOMORROW_UNITS or "metric").lower()
     ck = ("rt", location.strip().lower(), use_units)
-    cached = _cache_get(ck)
-    if cached is not None:
-        return cached
+    return await _CACHE.get(ck, lambda: _fetch_realtime(location, use_units))
+
+
+async def _fetch_realtime(location: str, use_units: str) -> Dict[str, Any]:
     url = f"{TOMORROW_BASE_URL.rstrip('/')}/weather/realtime"
     params = {"location": location, "units": use_units, "apikey": TOMORROW_API_KEY}
 
     try:
-        resp = requests.get(url, params=params, timeout=8)
-    except requests.RequestException as exc:
+        resp = await _get(url, params)
+    except _HTTP_ERRORS as exc:
         # Try Open-Meteo fallback via geocode
-        fm = _fallback_openmeteo_realtime(location, use_units)
+        fm = await _fallback_openmeteo_realtime(location, use_units)
         if fm:
-            _cache_set(ck, fm)
             return fm
         raise WeatherError(f"connection error: {exc}") from exc
 
     if resp.status_code >= 400:
         # Try geocoding fallback on invalid location errors
         if WEATHER_GEOCODE_FALLBACK and resp.status_code == 400:
-            coords = _geocode_to_coords(location)
+            coords = await _geocode_to_coords(location)
             if coords:
                 params["location"] = f"{coords['lat']},{coords['lon']}"
                 try:
-                    retry = requests.get(url, params=params, timeout=8)
-                except requests.RequestException as exc:
+                    retry = await _get(url, params)
+                except _HTTP_ERRORS as exc:
                     # If Tomorrow.io fails after geocoding, fall back to Open-Meteo
-                    fm = _fallback_openmeteo_realtime(location, use_units)
+                    fm = await _fallback_openmeteo_realtime(location, use_units)
                     if fm:
                         return fm
                     raise WeatherError(f"connection error after geocoding: {exc}") from exc
                 if retry.status_code < 400:
-                    data = retry.json() or {}
-                    values = (data.get("data") or {}).get("values") or {}
-                    ts = (data.get("data") or {}).get("time")
-                    labels = _units_labels(use_units)
-                    result = {
-                        "location": location,
-                        "observed_at": ts,
-                        "units": use_units,
-                        "temperature": values.get("temperature"),
-                        "temperatureApparent": values.get("temperatureApparent"),
-                        "humidity": values.get("humidity"),
-                        "windSpeed": values.get("windSpeed"),
-                        "weatherCode": values.get("weatherCode"),
-                        "precipitationIntensity": values.get("rainIntensity") or values.get("precipitationIntensity"),
-                        "uvIndex": values.get("uvIndex"),
-                        "visibility": values.get("visibility"),
-                        "labels": labels,
-                        "raw": data,
-                        "resolved_location": params["location"],
-                        "resolved_label": coords.get("label"),
-                    }
-                    _cache_set(ck, result)
+                    result = _realtime_result(retry.json() or {}, location, use_units)
+                    result["resolved_location"] = params["location"]
+                    result["resolved_label"] = coords.get("label")
                     return result
         # If not a 400, or geocoding didn't help, try Open-Meteo as a final fallback
-        fm = _fallback_openmeteo_realtime(location, use_units)
+        fm = await _fallback_openmeteo_realtime(location, use_units)
         if fm:
-            _cache_set(ck, fm)
             return fm
         raise WeatherError(f"API error: {resp.status_code} {resp.text}")
 
-    data = resp.json() or {}
-    values = (data.get("data") or {}).get("values") or {}
-    ts = (data.get("data") or {}).get("time")
-
-    labels = _units_labels(use_units)
-    result = {
-        "location": location,
-        "observed_at": ts,
-        "units": use_units,
-        "temperature": values.get("temperature"),
-        "temperatureApparent": values.get("temperatureApparent"),
-        "humidity": values.get("humidity"),
-        "windSpeed": values.get("windSpeed"),
-        "weatherCode": values.get("weatherCode"),
-        "precipitationIntensity": values.get("rainIntensity") or values.get("precipitationIntensity"),
-        "uvIndex": values.get("uvIndex"),
-        "visibility": values.get("visibility"),
-        "labels": labels,
-        "raw": data,
-    }
-    _cache_set(ck, result)
+    result = _realtime_result(resp.json() or {}, location, use_units)
     return result
 
 
-def forecast(location: str, units: Optional[str] = None, days: int = 7) -> List[Dict[str, Any]]:
+async def forecast(location: str, units: Optional[str] = None, days: int = 7) -> List[Dict[str, Any]]:
     """
     Fetch a simple daily forecast from Tomorrow.io v4.
     Returns a list of day dicts with date, highs/lows and a few key metrics.
@@ -171,9 +283,10 @@ def forecast(location: str, units: Optional[str] = None, days: int = 7) -> List[
 
     use_units = (units or TOMORROW_UNITS or "metric").lower()
     ck = ("daily", location.strip().lower(), use_units, int(days))
-    cached = _cache_get(ck)
-    if cached is not None:
-        return cached
+    return await _CACHE.get(ck, lambda: _fetch_forecast(location, use_units, days))
+
+
+async def _fetch_forecast(location: str, use_units: str, days: int) -> List[Dict[str, Any]]:
     url = f"{TOMORROW_BASE_URL.rstrip('/')}/weather/forecast"
     params = {
         "location": location,
@@ -183,20 +296,18 @@ def forecast(location: str, units: Optional[str] = None, days: int = 7) -> List[
     }
 
     try:
-        resp = requests.get(url, params=params, timeout=8)
-    except requests.RequestException as exc:
+        resp = await _get(url, params)
+    except _HTTP_ERRORS as exc:
         # Fallback
-        fm = _fallback_openmeteo_daily(location, use_units, days)
+        fm = await _fallback_openmeteo_daily(location, use_units, days)
         if fm is not None:
-            _cache_set(ck, fm)
             return fm
         raise WeatherError(f"connection error: {exc}") from exc
 
     if resp.status_code >= 400:
-        # Do not geocode here; the chat path already geocodes for realtime
-        fm = _fallback_openmeteo_daily(location, use_units, days)
+        # Do not geocode for Tomorrow.io here; the Open-Meteo fallback resolves the place
+        fm = await _fallback_openmeteo_daily(location, use_units, days)
         if fm is not None:
-            _cache_set(ck, fm)
             return fm
         raise WeatherError(f"API error: {resp.status_code} {resp.text}")
 
@@ -219,11 +330,10 @@ def forecast(location: str, units: Optional[str] = None, days: int = 7) -> List[
                 "uvIndexMax": vals.get("uvIndexMax"),
             }
         )
-    _cache_set(ck, out)
     return out
 
 
-def forecast_hourly(location: str, units: Optional[str] = None, hours: int = 12) -> List[Dict[str, Any]]:
+async def forecast_hourly(location: str, units: Optional[str] = None, hours: int = 12) -> List[Dict[str, Any]]:
     """
     Fetch an hourly forecast for the next `hours` hours (default 12).
     Returns list of { time, temperature, temperatureApparent, precipitationProbability, windSpeed, weatherCode }.
@@ -235,9 +345,10 @@ def forecast_hourly(location: str, units: Optional[str] = None, hours: int = 12)
 
     use_units = (units or TOMORROW_UNITS or "metric").lower()
     ck = ("hourly", location.strip().lower(), use_units, int(hours))
-    cached = _cache_get(ck)
-    if cached is not None:
-        return cached
+    return await _CACHE.get(ck, lambda: _fetch_forecast_hourly(location, use_units, hours))
+
+
+async def _fetch_forecast_hourly(location: str, use_units: str, hours: int) -> List[Dict[str, Any]]:
     url = f"{TOMORROW_BASE_URL.rstrip('/')}/weather/forecast"
     params = {
         "location": location,
@@ -247,21 +358,63 @@ def forecast_hourly(location: str, units: Optional[str] = None, hours: int = 12)
     }
 
     try:
-        resp = requests.get(url, params=params, timeout=8)
-    except requests.RequestException as exc:
-        fm = _fallback_openmeteo_hourly(location, use_units, hours)
+        resp = await _get(url, params)
+    except _HTTP_ERRORS as exc:
+        fm = await _fallback_openmeteo_hourly(location, use_units, hours)
         if fm is not None:
-            _cache_set(ck, fm)
             return fm
         raise WeatherError(f"connection error: {exc}") from exc
 
     if resp.status_code >= 400:
-        fm = _fallback_openmeteo_hourly(location, use_units, hours)
+        fm = await _fallback_openmeteo_hourly(location, use_units, hours)
         if fm is not None:
-            _cache_set(ck, fm)
             return fm
         raise WeatherError(f"API error: {resp.status_code} {resp.text}")
 
+    data = resp.json() or {}
+    timelines = data.get("timelines", {})
+    hourly = timelines.get("hourly") or []
+    out: List[Dict[str, Any]] = []
+    for item in hourly[: max(1, int(hours))]:
+        vals = item.get("values", {})
+        out.append(
+            {
+                "time": item.get("time"),
+                "temperature": vals.get("temperature"),
+                "temperatureApparent": vals.get("temperatureApparent"),
+                "precipitationProbability": vals.get("precipitationProbability"),
+                "windSpeed": vals.get("windSpeed"),
+                "weatherCode": vals.get("weatherCode"),
+            }
+        )
+    return out
+
+
+async def fetch_weather(location: str, units: Optional[str] = None, hours: int = 12, days: int = 7):
+    """
+    Fetch current conditions, the daily and the hourly forecast concurrently.
+    Yields ("current" | "daily" | "hourly", result) as each one completes;
+    a part that failed yields its WeatherError as the result. Closing the
+    generator early cancels whatever is still in flight.
+    """
+    tasks = {
+        asyncio.create_task(realtime(location, units)): "current",
+        asyncio.create_task(forecast(location, units, days)): "daily",
+        asyncio.create_task(forecast_hourly(location, units, hours)): "hourly",
+    }
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                exc = task.exception()
+                if exc is not None and not isinstance(exc, WeatherError):
+                    raise exc
+                yield tasks[task], exc if exc is not None else task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
 
 def _map_openmeteo_code_to_tomorrow(code: Optional[int]) -> Optional[int]:
     try:
@@ -298,12 +451,12 @@ def _parse_latlon(text: str) -> Optional[Dict[str, str]]:
     return {"lat": m.group(1), "lon": m.group(2)}
 
 
-def _coords_for(location: str) -> Optional[Dict[str, str]]:
-    return _parse_latlon(location) or _geocode_to_coords(location)
+async def _coords_for(location: str) -> Optional[Dict[str, str]]:
+    return _parse_latlon(location) or await _geocode_to_coords(location)
 
 
-def _fallback_openmeteo_realtime(location: str, units: str) -> Optional[Dict[str, Any]]:
-    coords = _coords_for(location)
+async def _fallback_openmeteo_realtime(location: str, units: str) -> Optional[Dict[str, Any]]:
+    coords = await _coords_for(location)
     if not coords:
         return None
     lat, lon = coords["lat"], coords["lon"]
@@ -318,7 +471,7 @@ def _fallback_openmeteo_realtime(location: str, units: str) -> Optional[Dict[str
         "forecast_days": 1,
     }
     try:
-        r = requests.get(OPENMETEO_URL, params=params, timeout=8)
+        r = await _get(OPENMETEO_URL, params)
         if r.status_code >= 400:
             return None
         j = r.json() or {}
@@ -340,12 +493,12 @@ def _fallback_openmeteo_realtime(location: str, units: str) -> Optional[Dict[str
             "resolved_location": f"{lat},{lon}",
             "resolved_label": coords.get("label"),
         }
-    except requests.RequestException:
+    except _HTTP_ERRORS + (ValueError,):
         return None
 
 
-def _fallback_openmeteo_daily(location: str, units: str, days: int) -> Optional[List[Dict[str, Any]]]:
-    coords = _coords_for(location)
+async def _fallback_openmeteo_daily(location: str, units: str, days: int) -> Optional[List[Dict[str, Any]]]:
+    coords = await _coords_for(location)
     if not coords:
         return None
     lat, lon = coords["lat"], coords["lon"]
@@ -364,7 +517,7 @@ def _fallback_openmeteo_daily(location: str, units: str, days: int) -> Optional[
         "forecast_days": max(1, int(days)),
     }
     try:
-        r = requests.get(OPENMETEO_URL, params=params, timeout=8)
+        r = await _get(OPENMETEO_URL, params)
         if r.status_code >= 400:
             return None
         j = r.json() or {}
@@ -384,12 +537,12 @@ def _fallback_openmeteo_daily(location: str, units: str, days: int) -> Optional[
                 "uvIndexMax": (vals.get("uv_index_max") or [None])[i],
             })
         return out
-    except requests.RequestException:
+    except _HTTP_ERRORS + (ValueError,):
         return None
 
 
-def _fallback_openmeteo_hourly(location: str, units: str, hours: int) -> Optional[List[Dict[str, Any]]]:
-    coords = _coords_for(location)
+async def _fallback_openmeteo_hourly(location: str, units: str, hours: int) -> Optional[List[Dict[str, Any]]]:
+    coords = await _coords_for(location)
     if not coords:
         return None
     lat, lon = coords["lat"], coords["lon"]
@@ -404,7 +557,7 @@ def _fallback_openmeteo_hourly(location: str, units: str, hours: int) -> Optiona
         "forecast_days": 1,
     }
     try:
-        r = requests.get(OPENMETEO_URL, params=params, timeout=8)
+        r = await _get(OPENMETEO_URL, params)
         if r.status_code >= 400:
             return None
         j = r.json() or {}
@@ -421,49 +574,66 @@ def _fallback_openmeteo_hourly(location: str, units: str, hours: int) -> Optiona
                 "weatherCode": _map_openmeteo_code_to_tomorrow((vals.get("weather_code") or [None])[i]),
             })
         return out
-    except requests.RequestException:
+    except _HTTP_ERRORS + (ValueError,):
         return None
 
-    data = resp.json() or {}
-    timelines = data.get("timelines", {})
-    hourly = timelines.get("hourly") or []
-    out: List[Dict[str, Any]] = []
-    for item in hourly[: max(1, int(hours))]:
-        vals = item.get("values", {})
-        out.append(
-            {
-                "time": item.get("time"),
-                "temperature": vals.get("temperature"),
-                "temperatureApparent": vals.get("temperatureApparent"),
-                "precipitationProbability": vals.get("precipitationProbability"),
-                "windSpeed": vals.get("windSpeed"),
-                "weatherCode": vals.get("weatherCode"),
-            }
-        )
-    _cache_set(ck, out)
-    return out
+@functools.lru_cache(maxsize=1)
+def gazetteer() -> Gazetteer:
+    """The bundled city list, loaded on first use (empty if the file is missing)."""
+    try:
+        return Gazetteer.load(WEATHER_GAZETTEER_PATH)
+    except (OSError, ValueError) as exc:
+        print(f"Gazetteer unavailable ({WEATHER_GAZETTEER_PATH}): {exc}")
+        return Gazetteer([])
 
 
-def _geocode_to_coords(query: str) -> Optional[Dict[str, str]]:
-    """Resolve a place name to lat/lon using a public geocoding service.
+async def _geocode_to_coords(query: str) -> Optional[Dict[str, str]]:
+    """Resolve a place name to lat/lon.
 
-    This is a best-effort fallback for misspelled or ambiguous locations.
-    Returns a dict {"lat": str, "lon": str} or None on failure.
+    Common cities resolve from the bundled gazetteer without any network
+    call. Other names go to the public geocoders, whose answers are kept in
+    a persistent cache keyed by the normalized name; concurrent lookups of
+    the same place (realtime, daily and hourly fallbacks) share one request.
+    Returns a dict {"lat": str, "lon": str, "label": str} or None on failure.
     """
     q = (query or "").strip()
-    if not q:
-        return None
     # Normalize common trailing time words so queries like "denver today" resolve
-    try:
-        import re as _re
-        qn = _re.sub(r"\b(?:today|now|tonight|tomorrow|this\s+(?:morning|afternoon|evening|week|weekend))\b\s*$", "", q, flags=_re.IGNORECASE).strip()
-        if qn:
-            q = qn
-    except Exception:
-        pass
+    q = _TIME_WORDS.sub("", q).strip() or q
+    key = normalize_place(q)
+    if not key:
+        return None
+
+    place = gazetteer().lookup(key)
+    if place is not None:
+        metrics.incr("weather.geocode.gazetteer")
+        return {"lat": str(place.lat), "lon": str(place.lon), "label": place.label}
+
+    cached = (await asyncio.to_thread(_GEOCODE_CACHE.get, TieredCache.make_key("geocode", key)))[0]
+    if cached:
+        metrics.incr("weather.geocode.cache")
+        return dict(cached)
+
+    task = _GEOCODE_INFLIGHT.get(key)
+    if task is None:
+        metrics.incr("weather.geocode.network")
+        task = asyncio.create_task(_geocode_lookup(q, key))
+        _GEOCODE_INFLIGHT[key] = task
+        task.add_done_callback(lambda _t, key=key: _GEOCODE_INFLIGHT.pop(key, None))
+    coords = await asyncio.shield(task)
+    return dict(coords) if coords else None
+
+
+async def _geocode_lookup(q: str, key: str) -> Optional[Dict[str, str]]:
+    coords = await _geocode_providers(q)
+    if coords:
+        await asyncio.to_thread(_GEOCODE_CACHE.set, TieredCache.make_key("geocode", key), coords)
+    return coords
+
+
+async def _geocode_providers(q: str) -> Optional[Dict[str, str]]:
     # Provider 1: OSM via maps.co
     try:
-        resp = requests.get(GEOCODE_URL, params={"q": q, "format": "json", "limit": 1}, timeout=10)
+        resp = await _get(GEOCODE_URL, {"q": q, "format": "json", "limit": 1}, timeout=10)
         if resp.status_code < 400:
             arr = resp.json() or []
             if arr:
@@ -473,12 +643,12 @@ def _geocode_to_coords(query: str) -> Optional[Dict[str, str]]:
                 if lat and lon:
                     label = first.get("display_name") or first.get("name") or q
                     return {"lat": str(lat), "lon": str(lon), "label": str(label)}
-    except requests.RequestException:
+    except _HTTP_ERRORS + (ValueError,):
         pass
 
     # Provider 2: Open‑Meteo Geocoding (no key required)
     try:
-        resp2 = requests.get(OPENMETEO_GEOCODE_URL, params={"name": q, "count": 1, "language": "en"}, timeout=10)
+        resp2 = await _get(OPENMETEO_GEOCODE_URL, {"name": q, "count": 1, "language": "en"}, timeout=10)
         if resp2.status_code < 400:
             data = resp2.json() or {}
             results = data.get("results") or []
@@ -490,7 +660,7 @@ def _geocode_to_coords(query: str) -> Optional[Dict[str, str]]:
                     label_parts = [r.get("name"), r.get("admin1"), r.get("country")]
                     label = ", ".join([p for p in label_parts if p]) or q
                     return {"lat": str(lat), "lon": str(lon), "label": str(label)}
-    except requests.RequestException:
+    except _HTTP_ERRORS + (ValueError,):
         pass
 
     return None
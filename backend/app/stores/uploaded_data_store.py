@@ -1,2 +1,201 @@
-from typing import Dict, Any
-uploaded_data_store: Dict[str, Any] = {}
\ No newline at end of file
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+
+ANALYSIS_DATA_DIR = os.getenv("ANALYSIS_DATA_DIR", "/app/analysis_data")
+USER_QUOTA_BYTES = int(float(os.getenv("ANALYSIS_USER_QUOTA_MB", "200") or 200) * 1024 * 1024)
+GLOBAL_QUOTA_BYTES = int(float(os.getenv("ANALYSIS_GLOBAL_QUOTA_MB", "2048") or 2048) * 1024 * 1024)
+
+
+class QuotaError(Exception):
+    pass
+
+
+@dataclass
+class Dataset:
+    user_sub: str
+    name: str
+    filename: str
+    path: str
+    size_bytes: int
+    last_used: float
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+
+def _key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:20]
+
+
+def _arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """Feather needs string column names, a default index and single-typed columns."""
+    out = df.reset_index(drop=True)
+    out.columns = [str(c) for c in out.columns]
+    for col in out.columns:
+        if out[col].dtype == object:
+            kind = pd.api.types.infer_dtype(out[col], skipna=True)
+            if kind not in ("string", "empty", "bytes", "boolean", "integer", "floating", "decimal"):
+                out[col] = out[col].map(lambda v: v if pd.isna(v) else str(v))
+    return out
+
+
+class DatasetStore:
+    """
+    Per-user named datasets kept on local disk as uncompressed Feather files so
+    reads can memory-map them instead of re-parsing the original upload.
+
+    Byte quotas apply per user and across all users; when a new dataset would
+    exceed either one, least-recently-used datasets are dropped first.
+
+    New files are written to a staging directory without the lock and moved
+    into place under it, so the index, the quota accounting and the dataset
+    directories only ever change together. All methods block on disk; call
+    them via asyncio.to_thread from async code.
+    """
+
+    def __init__(self, root: str, user_quota: int, global_quota: int):
+        self.root = root
+        self.user_quota = user_quota
+        self.global_quota = global_quota
+        self._index: Dict[tuple, Dataset] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    # --- index -----------------------------------------------------------
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        for user_dir in os.listdir(self.root):
+            udir = os.path.join(self.root, user_dir)
+            if user_dir.startswith(".") or not os.path.isdir(udir):
+                continue
+            for ds_dir in os.listdir(udir):
+                meta_path = os.path.join(udir, ds_dir, "meta.json")
+                data_path = os.path.join(udir, ds_dir, "data.feather")
+                try:
+                    with open(meta_path, "r", encoding="utf-8") as f:
+                        meta = json.load(f)
+                    ds = Dataset(
+                        user_sub=meta["user_sub"],
+                        name=meta["name"],
+                        filename=meta.get("filename", ""),
+                        path=data_path,
+                        size_bytes=os.path.getsize(data_path),
+                        last_used=os.path.getmtime(data_path),
+                        meta=meta.get("meta") or {},
+                    )
+                except (OSError, ValueError, KeyError):
+                    # Half-written (or still being written) dataset; skip it.
+                    continue
+                self._index[(ds.user_sub, ds.name)] = ds
+        self._loaded = True
+
+    def _user_bytes(self, user_sub: str) -> int:
+        return sum(d.size_bytes for d in self._index.values() if d.user_sub == user_sub)
+
+    def _total_bytes(self) -> int:
+        return sum(d.size_bytes for d in self._index.values())
+
+    def _drop(self, ds: Dataset):
+        self._index.pop((ds.user_sub, ds.name), None)
+        shutil.rmtree(os.path.dirname(ds.path), ignore_errors=True)
+
+    def _evict_for(self, user_sub: str, incoming: int, keep: tuple):
+        if incoming > self.user_quota or incoming > self.global_quota:
+            raise QuotaError(
+                f"Dataset is {incoming / (1024 * 1024):.1f}MB after conversion; "
+                f"limit is {min(self.user_quota, self.global_quota) / (1024 * 1024):.1f}MB"
+            )
+        by_age = sorted(self._index.values(), key=lambda d: d.last_used)
+        for ds in by_age:
+            if self._user_bytes(user_sub) + incoming <= self.user_quota:
+                break
+            if ds.user_sub == user_sub and (ds.user_sub, ds.name) != keep:
+                self._drop(ds)
+        for ds in by_age:
+            if self._total_bytes() + incoming <= self.global_quota:
+                break
+            if (ds.user_sub, ds.name) in self._index and (ds.user_sub, ds.name) != keep:
+                self._drop(ds)
+
+    # --- public API -------------------------------------------------------
+
+    def put(self, user_sub: str, name: str, df: pd.DataFrame, filename: str, meta: Dict[str, Any]) -> Dataset:
+        # Staged outside the dataset directory, which a concurrent delete may remove.
+        staging = os.path.join(self.root, ".staging")
+        os.makedirs(staging, exist_ok=True)
+        tmp_path = os.path.join(staging, f"{_key(user_sub)}.{_key(name)}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            _arrow_safe(df).to_feather(tmp_path, compression="uncompressed")
+            size = os.path.getsize(tmp_path)
+            with self._lock:
+                self._ensure_loaded()
+                previous = self._index.pop((user_sub, name), None)
+                try:
+                    self._evict_for(user_sub, size, keep=(user_sub, name))
+                except QuotaError:
+                    if previous:
+                        self._index[(user_sub, name)] = previous
+                    raise
+                ds_dir = os.path.join(self.root, _key(user_sub), _key(name))
+                os.makedirs(ds_dir, exist_ok=True)
+                data_path = os.path.join(ds_dir, "data.feather")
+                os.replace(tmp_path, data_path)
+                with open(os.path.join(ds_dir, "meta.json"), "w", encoding="utf-8") as f:
+                    json.dump({"user_sub": user_sub, "name": name, "filename": filename, "meta": meta}, f, default=str)
+                ds = Dataset(user_sub, name, filename, data_path, size, time.time(), meta)
+                self._index[(user_sub, name)] = ds
+                return ds
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def get(self, user_sub: str, name: Optional[str] = None) -> Optional[Dataset]:
+        """Return a dataset by name, or the user's most recently used one."""
+        with self._lock:
+            self._ensure_loaded()
+            if name is not None:
+                ds = self._index.get((user_sub, name))
+            else:
+                mine = [d for d in self._index.values() if d.user_sub == user_sub]
+                ds = max(mine, key=lambda d: d.last_used) if mine else None
+            if ds:
+                ds.last_used = time.time()
+                try:
+                    os.utime(ds.path)
+                except OSError:
+                    pass
+            return ds
+
+    def load(self, ds: Dataset, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        import pyarrow.feather as feather
+
+        table = feather.read_table(ds.path, columns=columns, memory_map=True)
+        return table.to_pandas()
+
+    def list(self, user_sub: str) -> List[Dataset]:
+        with self._lock:
+            self._ensure_loaded()
+            mine = [d for d in self._index.values() if d.user_sub == user_sub]
+        return sorted(mine, key=lambda d: d.last_used, reverse=True)
+
+    def delete(self, user_sub: str, name: str) -> bool:
+        with self._lock:
+            self._ensure_loaded()
+            ds = self._index.get((user_sub, name))
+            if not ds:
+                return False
+            self._drop(ds)
+            return True
+
+
+dataset_store = DatasetStore(ANALYSIS_DATA_DIR, USER_QUOTA_BYTES, GLOBAL_QUOTA_BYTES)
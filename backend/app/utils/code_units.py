@@ -0,0 +1,71 @@
+import ast
+import bisect
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+
+@dataclass
+class CodeUnit:
+    kind: str  # "imports" | "function" | "class" | "statements"
+    name: str
+    start: int  # 1-based, inclusive
+    end: int  # 1-based, inclusive
+
+    def text(self, lines: List[str]) -> str:
+        return "\n".join(lines[self.start - 1:self.end])
+
+
+def _node_kind(node: ast.stmt) -> str:
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        return "imports"
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return "function"
+    if isinstance(node, ast.ClassDef):
+        return "class"
+    return "statements"
+
+
+def partition(source: str, tree: Optional[ast.Module] = None) -> List[CodeUnit]:
+    """
+    Split a module into top-level units: one per function or class (with its
+    decorators and the comment block directly above it), and one per run of
+    consecutive imports or other module-level statements. Blank lines and
+    comments between units belong to no unit and are never rewritten.
+    Raises SyntaxError if `source` does not parse.
+    """
+    tree = tree or ast.parse(source)
+    lines = source.splitlines()
+    units: List[CodeUnit] = []
+    for node in tree.body:
+        kind = _node_kind(node)
+        start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+        end = node.end_lineno or node.lineno
+        last = units[-1] if units else None
+        if kind in ("function", "class"):
+            while start - 1 > (last.end if last else 0) and lines[start - 2].lstrip().startswith("#"):
+                start -= 1
+            units.append(CodeUnit(kind, node.name, start, end))
+        elif last and last.kind == kind and (kind == "imports" or start == last.end + 1):
+            # Import runs merge across blank lines; other statements only when adjacent.
+            last.end = end
+        else:
+            units.append(CodeUnit(kind, kind, start, end))
+    return units
+
+
+def unit_at(units: List[CodeUnit], lineno: int) -> Optional[int]:
+    """Index of the unit containing `lineno`, or None."""
+    idx = bisect.bisect_right([u.start for u in units], lineno) - 1
+    if idx >= 0 and units[idx].start <= lineno <= units[idx].end:
+        return idx
+    return None
+
+
+def splice(source: str, units: List[CodeUnit], replacements: Dict[int, str]) -> str:
+    """Replace the line ranges of the given units (by index) with new text."""
+    lines = source.splitlines()
+    for idx in sorted(replacements, key=lambda i: units[i].start, reverse=True):
+        unit = units[idx]
+        lines[unit.start - 1:unit.end] = replacements[idx].rstrip("\n").split("\n")
+    out = "\n".join(lines)
+    return out + "\n" if source.endswith("\n") else out
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def content_hash_file(fh, chunk_size: int = 1024 * 1024) -> str:
+    """sha256 of a binary file object, read in chunks and rewound afterwards."""
+    digest = hashlib.sha256()
+    fh.seek(0)
+    for block in iter(lambda: fh.read(chunk_size), b""):
+        digest.update(block)
+    fh.seek(0)
+    return digest.hexdigest()
+
+
+class TieredCache:
+    """
+    Small two-tier cache for JSON-serializable values: a bounded in-memory LRU
+    in front of one-file-per-entry storage on local disk. Disk entries survive
+    restarts and are pruned oldest-first once `disk_items` is exceeded.
+    """
+
+    def __init__(self, directory: str, memory_items: int = 256, disk_items: int = 10000):
+        self.directory = directory
+        self.memory_items = memory_items
+        self.disk_items = disk_items
+        self._mem: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_count: Optional[int] = None
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        return hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _remember(self, key: str, value: Any):
+        if self.memory_items <= 0:
+            return
+        with self._lock:
+            self._mem[key] = value
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.memory_items:
+                self._mem.popitem(last=False)
+
+    def get(self, key: str) -> tuple[Any, Optional[str]]:
+        """Return (value, tier) where tier is "memory", "disk" or None on a miss."""
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                return self._mem[key], "memory"
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None, None
+        self._remember(key, value)
+        return value, "disk"
+
+    def set(self, key: str, value: Any) -> None:
+        self._remember(key, value)
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            existed = os.path.exists(path)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        if not existed:
+            self._after_disk_insert()
+
+    def _after_disk_insert(self):
+        if self.disk_items <= 0:
+            return
+        with self._lock:
+            if self._disk_count is None:
+                self._disk_count = sum(len(files) for _, _, files in os.walk(self.directory))
+            else:
+                self._disk_count += 1
+            if self._disk_count <= self.disk_items:
+                return
+            entries = []
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    p = os.path.join(root, name)
+                    try:
+                        entries.append((os.path.getmtime(p), p))
+                    except OSError:
+                        continue
+            entries.sort()
+            # Trim to 90% so pruning does not run on every insert at the limit.
+            excess = len(entries) - int(self.disk_items * 0.9)
+            for _, p in entries[:max(0, excess)]:
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            self._disk_count = len(entries) - max(0, excess)
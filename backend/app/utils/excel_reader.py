@@ -0,0 +1,137 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterator, List, Tuple, Union
+
+import pandas as pd
+
+
+EXCEL_CACHE_SHEETS = int(os.getenv("EXCEL_CACHE_SHEETS", "32") or 32)
+# Parsed sheets are also bounded by their approximate in-memory size.
+EXCEL_CACHE_BYTES = int(float(os.getenv("EXCEL_CACHE_MB", "256") or 256) * 1024 * 1024)
+
+SheetRef = Union[str, int]
+
+_SHEET_CACHE: "OrderedDict[tuple, Tuple[pd.DataFrame, int]]" = OrderedDict()
+_NAMES_CACHE: "OrderedDict[str, List[str]]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+_sheet_cache_bytes = 0
+
+
+def _engine() -> str:
+    """Prefer the Rust calamine reader when installed; otherwise openpyxl."""
+    try:
+        import python_calamine  # noqa: F401
+        return "calamine"
+    except ImportError:
+        return "openpyxl"
+
+
+ENGINE = os.getenv("EXCEL_ENGINE") or _engine()
+
+
+def _cache_get(cache: OrderedDict, key):
+    with _CACHE_LOCK:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def _cache_set(cache: OrderedDict, key, value):
+    if EXCEL_CACHE_SHEETS <= 0:
+        return
+    with _CACHE_LOCK:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > EXCEL_CACHE_SHEETS:
+            cache.popitem(last=False)
+
+
+def _sheet_get(key) -> pd.DataFrame | None:
+    entry = _cache_get(_SHEET_CACHE, key)
+    return entry[0] if entry is not None else None
+
+
+def _sheet_set(key, df: pd.DataFrame):
+    """Cache a parsed sheet, evicting the oldest ones past the item or byte budget."""
+    global _sheet_cache_bytes
+    nbytes = int(df.memory_usage(index=True, deep=True).sum())
+    if EXCEL_CACHE_SHEETS <= 0 or nbytes > EXCEL_CACHE_BYTES:
+        return
+    with _CACHE_LOCK:
+        old = _SHEET_CACHE.pop(key, None)
+        if old is not None:
+            _sheet_cache_bytes -= old[1]
+        _SHEET_CACHE[key] = (df, nbytes)
+        _sheet_cache_bytes += nbytes
+        while len(_SHEET_CACHE) > EXCEL_CACHE_SHEETS or _sheet_cache_bytes > EXCEL_CACHE_BYTES:
+            _, (_, evicted) = _SHEET_CACHE.popitem(last=False)
+            _sheet_cache_bytes -= evicted
+
+
+class Workbook:
+    """
+    Lazily parsed view over an uploaded workbook.
+
+    The container is opened once and individual sheets are parsed only when
+    asked for. Parsed sheets are cached by (content hash, sheet name), so the
+    same upload arriving again skips parsing entirely. Returned frames are
+    shared with the cache and must not be mutated in place.
+    """
+
+    def __init__(self, raw: bytes):
+        self._raw = raw
+        self.digest = hashlib.sha256(raw).hexdigest()
+        self._book = None
+
+    def _open(self) -> pd.ExcelFile:
+        if self._book is None:
+            self._book = pd.ExcelFile(io.BytesIO(self._raw), engine=ENGINE)
+        return self._book
+
+    @property
+    def sheet_names(self) -> List[str]:
+        names = _cache_get(_NAMES_CACHE, self.digest)
+        if names is None:
+            names = [str(n) for n in self._open().sheet_names]
+            _cache_set(_NAMES_CACHE, self.digest, names)
+        return names
+
+    def _resolve(self, sheet: SheetRef) -> str:
+        names = self.sheet_names
+        if isinstance(sheet, int) or (isinstance(sheet, str) and sheet.isdigit() and sheet not in names):
+            idx = int(sheet)
+            if not 0 <= idx < len(names):
+                raise ValueError(f"Sheet index {idx} out of range (workbook has {len(names)} sheets)")
+            return names[idx]
+        if sheet not in names:
+            raise ValueError(f"Unknown sheet '{sheet}'. Available: {', '.join(names)}")
+        return sheet
+
+    def sheet(self, sheet: SheetRef = 0) -> pd.DataFrame:
+        name = self._resolve(sheet)
+        df = _sheet_get((self.digest, name))
+        if df is None:
+            df = self._open().parse(name)
+            _sheet_set((self.digest, name), df)
+        return df
+
+    def sheets(self) -> Iterator[Tuple[str, pd.DataFrame]]:
+        for name in self.sheet_names:
+            yield name, self.sheet(name)
+
+    def close(self):
+        if self._book is not None:
+            self._book.close()
+            self._book = None
+
+
+def read_excel(raw: bytes, sheet: SheetRef = 0) -> pd.DataFrame:
+    book = Workbook(raw)
+    try:
+        return book.sheet(sheet)
+    finally:
+        book.close()
@@ -0,0 +1,143 @@
+import bisect
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from app.utils.symbols import TypoIndex
+
+
+# Common country shorthands that are neither the ISO code nor the name.
+COUNTRY_ALIASES = {
+    "usa": "US", "u s": "US", "u s a": "US", "america": "US", "united states of america": "US",
+    "uk": "GB", "u k": "GB", "england": "GB", "scotland": "GB", "wales": "GB", "great britain": "GB", "britain": "GB",
+    "uae": "AE", "emirates": "AE", "holland": "NL", "czech republic": "CZ", "korea": "KR", "turkiye": "TR",
+}
+# A single wrong letter often spells another real place ("Frankfort" is not
+# "Frankfurt"), so substitutions are only forgiven in names at least this long.
+SUBSTITUTION_MIN_LEN = 10
+
+
+def normalize_place(text: str) -> str:
+    """Lowercase, strip accents and punctuation, keep commas: "São Paulo,  BR" -> "sao paulo, br"."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    parts = (" ".join(re.sub(r"[^\w]+", " ", part).split()) for part in text.split(","))
+    return ", ".join(part for part in parts if part)
+
+
+def near_miss(query: str, name: str) -> bool:
+    """
+    True when `query` is `name` with one letter dropped, added or swapped with
+    its neighbour, or (for long names) one letter wrong. Queries shorter than
+    four characters never match fuzzily.
+    """
+    if len(query) < 4 or abs(len(query) - len(name)) > 1:
+        return False
+    if len(query) == len(name):
+        diffs = [i for i, (a, b) in enumerate(zip(query, name)) if a != b]
+        if len(diffs) == 2:
+            i, j = diffs
+            return j == i + 1 and query[i] == name[j] and query[j] == name[i]
+        return len(diffs) == 1 and len(name) >= SUBSTITUTION_MIN_LEN
+    short, long = sorted((query, name), key=len)
+    i = 0
+    while i < len(short) and short[i] == long[i]:
+        i += 1
+    return short[i:] == long[i + 1:]
+
+
+@dataclass(frozen=True)
+class Place:
+    name: str
+    admin_code: str
+    admin: str
+    country_code: str
+    country: str
+    lat: float
+    lon: float
+    population: int  # thousands
+
+    @property
+    def label(self) -> str:
+        return ", ".join(p for p in (self.name, self.admin, self.country) if p)
+
+
+class Gazetteer:
+    """
+    Offline index of places: exact lookup on normalized names and aliases,
+    prefix search over the sorted name list, and trigram-backed fuzzy
+    matching for one-letter typos (see near_miss). Ambiguous names resolve to the most populous place
+    unless a qualifier ("Portland, ME", "london uk") narrows them down.
+    """
+
+    def __init__(self, places: Iterable[Place], aliases: Optional[Dict[int, List[str]]] = None):
+        self.places: List[Place] = list(places)
+        self._by_name: Dict[str, List[int]] = {}
+        for idx, place in enumerate(self.places):
+            for name in [place.name] + (aliases or {}).get(idx, []):
+                key = normalize_place(name)
+                if key and idx not in self._by_name.get(key, []):
+                    self._by_name.setdefault(key, []).append(idx)
+        self._keys = sorted(self._by_name)
+        self._typos = TypoIndex(self._keys, cutoff=0.75)
+
+    @classmethod
+    def load(cls, path: str) -> "Gazetteer":
+        """Read the tab-separated file written for this class (see app/data/gazetteer.tsv)."""
+        places: List[Place] = []
+        aliases: Dict[int, List[str]] = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                name, alias, admin_code, admin, cc, country, lat, lon, pop = line.rstrip("\n").split("\t")
+                aliases[len(places)] = [a for a in alias.split(",") if a]
+                places.append(Place(name, admin_code, admin, cc, country, float(lat), float(lon), int(pop or 0)))
+        return cls(places, aliases)
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    @staticmethod
+    def _qualifies(place: Place, qualifier: str) -> bool:
+        fields = (place.admin_code, place.admin, place.country_code, place.country)
+        return qualifier in {normalize_place(f) for f in fields if f} or COUNTRY_ALIASES.get(qualifier) == place.country_code
+
+    def _best(self, ids: Iterable[int], qualifiers: List[str]) -> Optional[Place]:
+        matches = [self.places[i] for i in ids if all(self._qualifies(self.places[i], q) for q in qualifiers)]
+        return max(matches, key=lambda p: p.population) if matches else None
+
+    def lookup(self, query: str) -> Optional[Place]:
+        """
+        Resolve "name[, qualifier...]" to a place. Without commas, trailing
+        words may act as the qualifier ("boston ma"). Falls back to a known
+        name one typo away ("bostn"); returns None otherwise, so that other
+        spellings and unknown places go to the geocoder.
+        """
+        parts = normalize_place(query).split(", ")
+        if not parts[0]:
+            return None
+        name, qualifiers = parts[0], parts[1:]
+        attempts = [(name, qualifiers)]
+        if not qualifiers:
+            words = name.split()
+            attempts += [(" ".join(words[:-k]), [" ".join(words[-k:])]) for k in (1, 2) if len(words) > k]
+        for candidate, quals in attempts:
+            place = self._best(self._by_name.get(candidate, ()), quals)
+            if place:
+                return place
+        guess = self._typos.best(name, accept=lambda candidate: near_miss(name, candidate))
+        return self._best(self._by_name[guess], qualifiers) if guess else None
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Place]:
+        """Places whose name or alias starts with `prefix`, most populous first."""
+        key = normalize_place(prefix)
+        if not key:
+            return []
+        ids = set()
+        for i in range(bisect.bisect_left(self._keys, key), len(self._keys)):
+            if not self._keys[i].startswith(key):
+                break
+            ids.update(self._by_name[self._keys[i]])
+        return sorted((self.places[i] for i in ids), key=lambda p: -p.population)[:limit]
@@ -0,0 +1,157 @@
+import io
+import math
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO, Union
+
+
+# Preprocessed images larger than this are kept on disk rather than in memory.
+SPOOL_MAX_BYTES = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class ImageProfile:
+    max_side: int
+    grayscale: bool
+    quality: int
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return (os.getenv(name, "true" if default else "false").lower() == "true")
+
+
+# Text extraction keeps more pixels (fine print) but drops colour; descriptions
+# only need enough detail for the scene, so they are downscaled harder.
+PROFILES = {
+    "extract_text": ImageProfile(
+        max_side=int(os.getenv("OCR_TEXT_MAX_SIDE", "2048") or 2048),
+        grayscale=_env_bool("OCR_TEXT_GRAYSCALE", True),
+        quality=int(os.getenv("OCR_TEXT_JPEG_QUALITY", "90") or 90),
+    ),
+    "describe": ImageProfile(
+        max_side=int(os.getenv("OCR_DESCRIBE_MAX_SIDE", "1024") or 1024),
+        grayscale=_env_bool("OCR_DESCRIBE_GRAYSCALE", False),
+        quality=int(os.getenv("OCR_DESCRIBE_JPEG_QUALITY", "85") or 85),
+    ),
+}
+
+
+def preprocess_image(raw: bytes, mode: str = "extract_text") -> bytes:
+    """Bytes-in/bytes-out wrapper around preprocess_image_file."""
+    src = io.BytesIO(raw)
+    out = preprocess_image_file(src, mode)
+    return raw if out is src else out.read()
+
+
+def preprocess_image_file(src: BinaryIO, mode: str = "extract_text") -> BinaryIO:
+    """
+    Normalize an uploaded image before it is sent to the vision model:
+    apply EXIF orientation, cap the longest side, optionally convert to
+    grayscale and re-encode. Photos become JPEG; PNG sources (screenshots,
+    flat scans) are re-encoded as both PNG and JPEG and the smaller one wins.
+    JPEGs are decoded at reduced scale when possible, so a large photo never
+    materializes at full resolution.
+
+    Returns a rewound file object: a spooled temp file holding the new image,
+    or `src` itself when Pillow is unavailable, the image cannot be decoded,
+    or nothing changed and re-encoding would not shrink the payload.
+    """
+    profile = PROFILES.get(mode) or PROFILES["extract_text"]
+    src.seek(0, os.SEEK_END)
+    src_size = src.tell()
+    src.seek(0)
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return src
+    try:
+        img = Image.open(src)
+        if img.format == "JPEG" and 0 < profile.max_side < max(img.size):
+            scale = profile.max_side / max(img.size)
+            img.draft(img.mode, (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+        img.load()
+    except Exception:
+        src.seek(0)
+        return src
+    lossless = img.format == "PNG"
+
+    changed = False
+    if img.getexif().get(0x0112, 1) != 1:
+        img = ImageOps.exif_transpose(img)
+        changed = True
+
+    if profile.max_side > 0 and max(img.size) > profile.max_side:
+        img.thumbnail((profile.max_side, profile.max_side), Image.Resampling.LANCZOS)
+        changed = True
+
+    if profile.grayscale:
+        if img.mode != "L":
+            img = _flatten(img).convert("L")
+            changed = True
+
+    encoded = _encode_jpeg(img, profile.quality)
+    if lossless:
+        out = io.BytesIO()
+        img.save(out, format="PNG", compress_level=6)
+        if len(out.getvalue()) < len(encoded):
+            encoded = out.getvalue()
+    if not changed and len(encoded) >= src_size:
+        src.seek(0)
+        return src
+    dst = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    dst.write(encoded)
+    dst.seek(0)
+    return dst
+
+
+def _encode_jpeg(img, quality: int) -> bytes:
+    if img.mode not in ("RGB", "L"):
+        img = _flatten(img)
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=quality, optimize=True)
+    return out.getvalue()
+
+
+def _flatten(img):
+    """Composite transparent images onto white so JPEG encoding keeps text legible."""
+    from PIL import Image
+
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        rgba = img.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.split()[-1])
+        return background
+    return img.convert("RGB")
+
+
+def split_into_bands(source: Union[bytes, BinaryIO], band_height: int, overlap: int, max_width: int) -> list[bytes]:
+    """
+    Cut a tall, high-resolution page into overlapping full-width horizontal
+    bands, top to bottom, encoded as PNG. Bands span the whole width so text
+    lines are never split mid-line; pages wider than `max_width` are scaled
+    down to it first. Returns [] if the image cannot be decoded and a single
+    band if the page already fits.
+    """
+    try:
+        from PIL import Image, ImageOps
+        img = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+        img.load()
+    except Exception:
+        return []
+    if img.getexif().get(0x0112, 1) != 1:
+        img = ImageOps.exif_transpose(img)
+    if img.width > max_width:
+        img = img.resize((max_width, round(img.height * max_width / img.width)), Image.Resampling.LANCZOS)
+    if img.mode not in ("RGB", "L"):
+        img = _flatten(img)
+
+    step = max(1, band_height - overlap)
+    tops = list(range(0, max(1, img.height - overlap), step))
+    bands = []
+    for top in tops:
+        band = img.crop((0, top, img.width, min(img.height, top + band_height)))
+        out = io.BytesIO()
+        band.save(out, format="PNG")
+        bands.append(out.getvalue())
+    return bands
@@ -0,0 +1,152 @@
+import re
+from collections import Counter
+from typing import Optional, Tuple
+
+
+# Unicode ranges for scripts that (mostly) identify a language on their own.
+_SCRIPTS = [
+    ("arabic", 0x0600, 0x06FF), ("arabic", 0x0750, 0x077F), ("arabic", 0xFB50, 0xFDFF), ("arabic", 0xFE70, 0xFEFF),
+    ("hebrew", 0x0590, 0x05FF),
+    ("cyrillic", 0x0400, 0x04FF),
+    ("greek", 0x0370, 0x03FF),
+    ("devanagari", 0x0900, 0x097F),
+    ("bengali", 0x0980, 0x09FF),
+    ("thai", 0x0E00, 0x0E7F),
+    ("hangul", 0xAC00, 0xD7AF), ("hangul", 0x1100, 0x11FF), ("hangul", 0x3130, 0x318F),
+    ("kana", 0x3040, 0x30FF),
+    ("han", 0x4E00, 0x9FFF), ("han", 0x3400, 0x4DBF),
+]
+
+_SCRIPT_LANGUAGE = {
+    "hebrew": "hebrew",
+    "greek": "greek",
+    "devanagari": "hindi",
+    "bengali": "bengali",
+    "thai": "thai",
+    "hangul": "korean",
+}
+
+# Short, high-frequency function words per Latin-script language. Counting
+# them is enough to separate these languages on paragraph-sized text.
+_STOPWORDS = {
+    "english": "the and of to in is that it for was on are with as be this by not or have from at which but you",
+    "french": "le la les de des et est un une du que qui dans pour pas sur au avec ce il elle sont nous vous",
+    "spanish": "el la los las de y que en un una es por con para no se del al lo como su pero más sus",
+    "portuguese": "o a os as de e que em um uma é do da dos das para com não se por mais ao na no",
+    "german": "der die das und ist nicht ein eine zu den von mit sich des auf für im dem auch es an",
+    "italian": "il la di e che è un una per non in del della con sono le gli da si al nel",
+    "dutch": "de het een en van is dat niet op te zijn met voor er die aan ook als bij",
+    "turkish": "ve bir bu da de için ile ne çok daha gibi olarak ama kadar mi ben sen o",
+    "indonesian": "yang dan di ke dari ini itu dengan untuk tidak ada akan pada juga dalam",
+}
+_STOPWORD_SETS = {lang: set(words.split()) for lang, words in _STOPWORDS.items()}
+
+_ALIASES = {
+    "en": "english", "eng": "english",
+    "fr": "french", "francais": "french", "français": "french",
+    "es": "spanish", "espanol": "spanish", "español": "spanish", "castilian": "spanish",
+    "pt": "portuguese", "português": "portuguese", "portugues": "portuguese",
+    "de": "german", "deutsch": "german",
+    "it": "italian", "italiano": "italian",
+    "nl": "dutch", "nederlands": "dutch", "flemish": "dutch",
+    "tr": "turkish", "türkçe": "turkish",
+    "id": "indonesian", "bahasa": "indonesian",
+    "ar": "arabic", "العربية": "arabic",
+    "fa": "persian", "farsi": "persian",
+    "ur": "urdu",
+    "he": "hebrew", "iw": "hebrew",
+    "ru": "russian", "uk": "ukrainian", "bg": "bulgarian",
+    "el": "greek",
+    "hi": "hindi", "bn": "bengali", "th": "thai",
+    "ko": "korean", "ja": "japanese", "zh": "chinese", "mandarin": "chinese",
+}
+
+_WORD = re.compile(r"[^\W\d_]+", re.UNICODE)
+MIN_LETTERS = 20
+
+
+def normalize_language(name: str) -> str:
+    """Map a user-facing language name or code ("English", "en-US") to a detector key."""
+    key = (name or "").strip().lower()
+    key = re.split(r"[\s(_]", key, maxsplit=1)[0] if key else key
+    key = key.split("-")[0]
+    return _ALIASES.get(key, key)
+
+
+def _script_counts(text: str) -> Tuple[Counter, int]:
+    counts: Counter = Counter()
+    letters = 0
+    for ch in text:
+        if not ch.isalpha():
+            continue
+        letters += 1
+        cp = ord(ch)
+        if cp < 0x0250:
+            counts["latin"] += 1
+            continue
+        for script, lo, hi in _SCRIPTS:
+            if lo <= cp <= hi:
+                counts[script] += 1
+                break
+        else:
+            counts["other"] += 1
+    return counts, letters
+
+
+def detect_language(text: str) -> Tuple[Optional[str], float]:
+    """
+    Guess the language of `text` from script statistics and, for Latin
+    script, function-word frequencies. Returns (language key, confidence in
+    0..1), or (None, 0.0) when the text is too short or ambiguous. Text with
+    no letters at all returns ("none", 1.0): it needs no translation.
+    """
+    counts, letters = _script_counts(text)
+    if letters == 0:
+        return "none", 1.0
+    if letters < MIN_LETTERS:
+        return None, 0.0
+    script, n = counts.most_common(1)[0]
+    share = n / letters
+
+    if script == "arabic":
+        if any(ch in text for ch in "ٹڈڑںھےۓ"):
+            return "urdu", share
+        if any(ch in text for ch in "پچژگکی") and not any(ch in text for ch in "ةىك"):
+            return "persian", share
+        return "arabic", share
+    if script == "cyrillic":
+        if any(ch in text for ch in "іїєґІЇЄҐ"):
+            return "ukrainian", share
+        if any(ch in text for ch in "ъЪ") and not any(ch in text for ch in "ыэЫЭ"):
+            return "bulgarian", share
+        return "russian", share
+    if script in ("kana", "han"):
+        if counts.get("kana", 0) / letters > 0.1:
+            return "japanese", (counts.get("kana", 0) + counts.get("han", 0)) / letters
+        return "chinese", share
+    if script in _SCRIPT_LANGUAGE:
+        return _SCRIPT_LANGUAGE[script], share
+    if script != "latin":
+        return None, 0.0
+
+    words = [w.lower() for w in _WORD.findall(text)]
+    if not words:
+        return None, 0.0
+    scores = {
+        lang: sum(1 for w in words if w in vocab)
+        for lang, vocab in _STOPWORD_SETS.items()
+    }
+    ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+    (best, top), (_, runner_up) = ranked[0], ranked[1]
+    if top < 2 or top < 0.08 * len(words):
+        return None, 0.0
+    margin = (top - runner_up) / top
+    return best, round(share * min(1.0, 0.5 + margin), 3)
+
+
+def is_language(text: str, language: str, threshold: float = 0.6) -> bool:
+    """True when `text` confidently reads as `language` (or has no letters)."""
+    detected, confidence = detect_language(text)
+    if detected == "none":
+        return True
+    return detected == normalize_language(language) and confidence >= threshold
@@ -0,0 +1,32 @@
+import threading
+from collections import defaultdict
+from typing import Dict
+
+
+# Process-local counters and timings; each worker reports its own view.
+_COUNTERS: Dict[str, float] = defaultdict(float)
+_TIMINGS: Dict[str, Dict[str, float]] = {}
+_LOCK = threading.Lock()
+
+
+def incr(name: str, value: float = 1) -> None:
+    with _LOCK:
+        _COUNTERS[name] += value
+
+
+def observe(name: str, seconds: float) -> None:
+    """Record a duration sample (count/sum/max) under `name`."""
+    with _LOCK:
+        t = _TIMINGS.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+        t["count"] += 1
+        t["sum"] += seconds
+        t["max"] = max(t["max"], seconds)
+
+
+def snapshot() -> dict:
+    with _LOCK:
+        timings = {
+            k: {**v, "avg": (v["sum"] / v["count"]) if v["count"] else 0.0}
+            for k, v in _TIMINGS.items()
+        }
+        return {"counters": dict(_COUNTERS), "timings": timings}
@@ -0,0 +1,69 @@
+import re
+from typing import List, Tuple
+
+
+NO_CHANGES = "NO CHANGES"
+
+_BLOCK = re.compile(
+    r"^<{5,9} ?SEARCH[^\n]*\n(.*?)^={5,9}[^\S\n]*\n(.*?)^>{5,9} ?REPLACE[^\n]*$",
+    re.DOTALL | re.MULTILINE,
+)
+
+
+class PatchError(ValueError):
+    pass
+
+
+def parse_search_replace(text: str) -> List[Tuple[str, str]]:
+    """
+    Parse SEARCH/REPLACE edit blocks:
+
+        <<<<<<< SEARCH
+        exact lines from the file
+        =======
+        replacement lines
+        >>>>>>> REPLACE
+
+    Returns [] for an explicit NO CHANGES reply; raises PatchError when the
+    text contains neither.
+    """
+    blocks = [(search.rstrip("\n"), replace.rstrip("\n")) for search, replace in _BLOCK.findall(text)]
+    if not blocks and NO_CHANGES not in text.upper():
+        raise PatchError("Model reply contained no SEARCH/REPLACE blocks")
+    return blocks
+
+
+def _find_lines(lines: List[str], needle: List[str]) -> List[int]:
+    """Start indexes where `needle` matches `lines`, ignoring trailing whitespace."""
+    stripped = [line.rstrip() for line in needle]
+    first = stripped[0]
+    return [
+        i for i in range(len(lines) - len(needle) + 1)
+        if lines[i].rstrip() == first and [line.rstrip() for line in lines[i:i + len(needle)]] == stripped
+    ]
+
+
+def apply_search_replace(source: str, blocks: List[Tuple[str, str]]) -> str:
+    """
+    Apply edit blocks in order. Each SEARCH must occur exactly once, either
+    verbatim or line-for-line up to trailing whitespace; anything else raises
+    PatchError so the caller can fall back to a full rewrite.
+    """
+    for n, (search, replace) in enumerate(blocks, start=1):
+        if not search.strip():
+            raise PatchError(f"Edit {n} has an empty SEARCH section")
+        count = source.count(search)
+        if count == 1:
+            source = source.replace(search, replace, 1)
+            continue
+        if count > 1:
+            raise PatchError(f"Edit {n} matches {count} places in the file")
+        lines = source.split("\n")
+        needle = search.split("\n")
+        hits = _find_lines(lines, needle)
+        if len(hits) != 1:
+            raise PatchError(f"Edit {n} does not match the file" if not hits else f"Edit {n} matches {len(hits)} places in the file")
+        start = hits[0]
+        lines[start:start + len(needle)] = replace.split("\n") if replace else []
+        source = "\n".join(lines)
+    return source
@@ -0,0 +1,125 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Set, Tuple
+
+
+# Rough size of a token for the models we serve; good enough for budgeting.
+CHARS_PER_TOKEN = 4
+
+_WORD = re.compile(r"[^\W_]+", re.UNICODE)
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+(?=[\"'(\[]?[A-Z0-9])|\n+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how",
+    "i", "in", "is", "it", "its", "me", "my", "of", "on", "or", "tell", "that", "the", "this",
+    "to", "was", "what", "when", "where", "which", "who", "why", "will", "with", "you",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _terms(text: str) -> List[str]:
+    return [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+
+
+def _shingles(text: str) -> Set[Tuple[str, ...]]:
+    words = _WORD.findall(text.lower())
+    if len(words) < 3:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def _similar(a: Set[tuple], b: Set[tuple], threshold: float) -> bool:
+    """Jaccard similarity, or containment of the smaller text in the larger one."""
+    if not a or not b:
+        return False
+    overlap = len(a & b)
+    return overlap / len(a | b) >= threshold or overlap / min(len(a), len(b)) >= 0.9
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_END.split(text or "") if s.strip()]
+
+
+def dedupe_results(results: List[dict], threshold: float = 0.8) -> List[dict]:
+    """Drop results whose title + snippet nearly repeats a higher-ranked one."""
+    kept: List[dict] = []
+    seen: List[Set[tuple]] = []
+    for result in results:
+        shingles = _shingles(f"{result.get('title', '')} {result.get('snippet', '')}")
+        if any(_similar(shingles, other, threshold) for other in seen):
+            continue
+        kept.append(result)
+        seen.append(shingles)
+    return kept
+
+
+def _score_sentences(query: str, sentences: List[str], k1: float = 1.2, b: float = 0.75) -> List[float]:
+    """BM25 of each sentence against the query, treating sentences as documents."""
+    query_terms = set(_terms(query))
+    docs = [Counter(_terms(s)) for s in sentences]
+    if not query_terms or not docs:
+        return [0.0] * len(sentences)
+    avg_len = sum(sum(d.values()) for d in docs) / len(docs) or 1.0
+    df = Counter(t for d in docs for t in query_terms if t in d)
+    n = len(docs)
+    scores = []
+    for d in docs:
+        length = sum(d.values())
+        score = 0.0
+        for t in query_terms:
+            tf = d.get(t, 0)
+            if tf:
+                idf = math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5))
+                score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_len))
+        scores.append(score)
+    return scores
+
+
+def compact_results(query: str, results: List[dict], budget_tokens: int, dedupe_threshold: float = 0.8) -> List[dict]:
+    """
+    Shrink search results to fit `budget_tokens` of prompt: near-duplicate
+    results are dropped, then sentences are taken in order of lexical
+    relevance to `query` (ties favour higher-ranked results and earlier
+    sentences) until the budget is spent. Each kept result keeps its title,
+    URL and chosen sentences in their original order; results with no
+    chosen sentence are dropped. When nothing matches the query the lead
+    sentences are used instead.
+    """
+    results = dedupe_results(results, dedupe_threshold)
+    candidates: List[Tuple[int, int, str]] = []  # (result rank, position, sentence)
+    for rank, result in enumerate(results):
+        for pos, sentence in enumerate(split_sentences(result.get("snippet", ""))):
+            candidates.append((rank, pos, sentence))
+    scores = _score_sentences(query, [c[2] for c in candidates])
+    if not any(scores):
+        scores = [1.0 / (1 + pos) for _, pos, _ in candidates]
+
+    order = sorted(range(len(candidates)), key=lambda i: (-scores[i], candidates[i][0], candidates[i][1]))
+    chosen: Dict[int, List[Tuple[int, str]]] = {}
+    seen_sentences: Set[str] = set()
+    remaining = budget_tokens
+    for i in order:
+        if scores[i] <= 0:
+            break
+        rank, pos, sentence = candidates[i]
+        key = " ".join(_WORD.findall(sentence.lower()))
+        if key in seen_sentences:
+            continue
+        cost = estimate_tokens(sentence) + 1
+        if rank not in chosen:
+            result = results[rank]
+            cost += estimate_tokens(f"{rank + 1}. {result.get('title', '')}\n{result.get('url', '')}\n")
+        if cost > remaining:
+            continue
+        remaining -= cost
+        seen_sentences.add(key)
+        chosen.setdefault(rank, []).append((pos, sentence))
+
+    compacted = []
+    for rank in sorted(chosen):
+        picked = " ".join(s for _, s in sorted(chosen[rank]))
+        compacted.append({**results[rank], "snippet": picked})
+    return compacted
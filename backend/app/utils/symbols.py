@@ -0,0 +1,323 @@
+import ast
+import builtins
+import difflib
+import heapq
+import keyword
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+
+# True/False/None are keywords, never ast.Name reads, so they must not be
+# offered as rename targets (e.g. `true` -> `True`).
+BUILTIN_NAMES = (set(dir(builtins)) - set(keyword.kwlist)) | {"__file__", "__builtins__", "__path__", "__annotations__"}
+# Bound implicitly in every class body.
+CLASS_BODY_NAMES = {"__module__", "__qualname__"}
+# The implicit cell of zero-argument super(): visible from any function
+# (and scopes nested in it) defined inside a class body, not the body itself.
+CLASS_CELL_NAME = "__class__"
+
+
+def is_dunder(name: str) -> bool:
+    return len(name) > 4 and name.startswith("__") and name.endswith("__")
+
+
+@dataclass(eq=False)
+class Scope:
+    kind: str  # "module" | "function" | "lambda" | "class" | "comprehension"
+    parent: Optional["Scope"]
+    names: Set[str] = field(default_factory=set)
+    global_names: Set[str] = field(default_factory=set)
+    star_import: bool = False
+
+
+@dataclass
+class NameRef:
+    name: str
+    lineno: int
+    col: int  # UTF-8 byte offset, as reported by ast
+    scope: Scope
+
+
+class SymbolTable:
+    """
+    Scoped symbol table built in one traversal of the module. Bindings are
+    recorded per scope (module, function, lambda, class, comprehension) and
+    every name read is kept as a reference; references are resolved after the
+    walk, so uses before a later definition (e.g. calls to functions defined
+    further down) resolve correctly. Class bodies are not visible from nested
+    functions or comprehensions, matching Python's rules.
+    """
+
+    def __init__(self, tree: ast.AST):
+        self.module = Scope("module", None)
+        self.scopes: List[Scope] = [self.module]
+        self.refs: List[NameRef] = []
+        _Builder(self).visit(tree)
+
+    def visible(self, name: str, scope: Scope) -> bool:
+        current, first, in_function = scope, True, False
+        while current is not None:
+            if (first or current.kind != "class") and name in current.names:
+                return True
+            if current.kind == "class" and in_function and name == CLASS_CELL_NAME:
+                return True
+            if current.star_import:
+                return True
+            in_function = in_function or current.kind in ("function", "lambda")
+            current, first = current.parent, False
+        return name in BUILTIN_NAMES
+
+    def undefined(self) -> Dict[str, List[NameRef]]:
+        """Names read somewhere they are not bound, mapped to their references."""
+        out: Dict[str, List[NameRef]] = defaultdict(list)
+        for ref in self.refs:
+            if not self.visible(ref.name, ref.scope):
+                out[ref.name].append(ref)
+        return dict(out)
+
+    def suggest(self, name: str, scope: Scope, index: "TypoIndex") -> Optional[str]:
+        """
+        Closest name visible from `scope`. Enclosing function scopes are small
+        and the likeliest home of a typo, so they are searched directly first;
+        module-level names and builtins go through the trigram index. Dunder
+        names are never suggested.
+        """
+        local: Set[str] = set()
+        current, first = scope, True
+        while current is not None and current.kind != "module":
+            if first or current.kind != "class":
+                local |= {n for n in current.names if not is_dunder(n)}
+            current, first = current.parent, False
+        match = difflib.get_close_matches(name, local, n=1, cutoff=index.cutoff)
+        if match:
+            return match[0]
+        return index.best(name, lambda candidate: not is_dunder(candidate) and self.visible(candidate, scope))
+
+    def bound_names(self) -> Set[str]:
+        names: Set[str] = set()
+        for scope in self.scopes:
+            names |= scope.names
+        return names
+
+    def rename_targets(self) -> Set[str]:
+        """Names a typo may be corrected to: bound names and builtins, minus dunders."""
+        return {n for n in self.bound_names() | BUILTIN_NAMES if not is_dunder(n)}
+
+
+class _Builder(ast.NodeVisitor):
+    def __init__(self, table: SymbolTable):
+        self.table = table
+        self.scope = table.module
+
+    # --- helpers -------------------------------------------------------
+
+    def _push(self, kind: str) -> Scope:
+        scope = Scope(kind, self.scope)
+        self.table.scopes.append(scope)
+        self.scope = scope
+        return scope
+
+    def _pop(self):
+        self.scope = self.scope.parent
+
+    def _bind(self, name: str, scope: Optional[Scope] = None):
+        scope = scope or self.scope
+        if name in scope.global_names:
+            scope = self.table.module
+        scope.names.add(name)
+
+    def _bind_args(self, args: ast.arguments):
+        for arg in args.posonlyargs + args.args + args.kwonlyargs:
+            self._bind(arg.arg)
+        if args.vararg:
+            self._bind(args.vararg.arg)
+        if args.kwarg:
+            self._bind(args.kwarg.arg)
+
+    def _visit_arg_annotations(self, args: ast.arguments):
+        for arg in args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg]:
+            if arg is not None and arg.annotation is not None:
+                self.visit(arg.annotation)
+
+    def _visit_all(self, nodes: Iterable[Optional[ast.AST]]):
+        for node in nodes:
+            if node is not None:
+                self.visit(node)
+
+    # --- bindings ------------------------------------------------------
+
+    def visit_Name(self, node: ast.Name):
+        if isinstance(node.ctx, ast.Load):
+            self.table.refs.append(NameRef(node.id, node.lineno, node.col_offset, self.scope))
+        else:
+            self._bind(node.id)
+
+    def visit_Global(self, node: ast.Global):
+        self.scope.global_names.update(node.names)
+        self.table.module.names.update(node.names)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            if alias.name == "*":
+                self.scope.star_import = True
+            else:
+                self._bind((alias.asname or alias.name).split(".")[0])
+
+    visit_ImportFrom = visit_Import
+
+    def visit_ExceptHandler(self, node: ast.ExceptHandler):
+        if node.name:
+            self._bind(node.name)
+        self.generic_visit(node)
+
+    def visit_NamedExpr(self, node: ast.NamedExpr):
+        self.visit(node.value)
+        target = self.scope
+        while target.kind == "comprehension":
+            target = target.parent
+        self._bind(node.target.id, target)
+
+    def visit_MatchAs(self, node):
+        if node.name:
+            self._bind(node.name)
+        self.generic_visit(node)
+
+    def visit_MatchStar(self, node):
+        if node.name:
+            self._bind(node.name)
+
+    def visit_MatchMapping(self, node):
+        if node.rest:
+            self._bind(node.rest)
+        self.generic_visit(node)
+
+    # --- scopes --------------------------------------------------------
+
+    def visit_FunctionDef(self, node):
+        self._bind(node.name)
+        self._visit_all(node.decorator_list)
+        self._visit_all(node.args.defaults + node.args.kw_defaults)
+        self._visit_arg_annotations(node.args)
+        self._visit_all([node.returns])
+        self._push("function")
+        self._bind_args(node.args)
+        self._visit_all(node.body)
+        self._pop()
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node: ast.Lambda):
+        self._visit_all(node.args.defaults + node.args.kw_defaults)
+        self._push("lambda")
+        self._bind_args(node.args)
+        self.visit(node.body)
+        self._pop()
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self._bind(node.name)
+        self._visit_all(node.decorator_list)
+        self._visit_all(node.bases)
+        self._visit_all(node.keywords)
+        self._push("class")
+        self.scope.names.update(CLASS_BODY_NAMES)
+        self._visit_all(node.body)
+        self._pop()
+
+    def _visit_comprehension(self, node, elements: List[ast.AST]):
+        first, rest = node.generators[0], node.generators[1:]
+        # The outermost iterable is evaluated in the enclosing scope.
+        self.visit(first.iter)
+        self._push("comprehension")
+        self.visit(first.target)
+        self._visit_all(first.ifs)
+        for gen in rest:
+            self.visit(gen.iter)
+            self.visit(gen.target)
+            self._visit_all(gen.ifs)
+        self._visit_all(elements)
+        self._pop()
+
+    def visit_ListComp(self, node):
+        self._visit_comprehension(node, [node.elt])
+
+    visit_SetComp = visit_ListComp
+    visit_GeneratorExp = visit_ListComp
+
+    def visit_DictComp(self, node):
+        self._visit_comprehension(node, [node.key, node.value])
+
+
+class TypoIndex:
+    """
+    Trigram index over identifiers for "did you mean" lookups. Candidates are
+    the names sharing the most padded trigrams with the query; only those are
+    scored with difflib, instead of comparing against every known name.
+    """
+
+    def __init__(self, names: Iterable[str], cutoff: float = 0.75, shortlist: int = 20):
+        self.cutoff = cutoff
+        self.shortlist = shortlist
+        self._names: List[str] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        for name in sorted(set(names)):
+            idx = len(self._names)
+            self._names.append(name)
+            for gram in self._grams(name):
+                self._postings[gram].append(idx)
+
+    @staticmethod
+    def _grams(name: str) -> Set[str]:
+        padded = f"$${name.lower()}$"
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def candidates(self, name: str) -> List[str]:
+        grams = self._grams(name)
+        hits: Counter = Counter()
+        for gram in grams:
+            hits.update(self._postings.get(gram, ()))
+        min_overlap = max(1, len(grams) // 3)
+        ranked = heapq.nlargest(self.shortlist + 1, hits.items(), key=lambda kv: kv[1])
+        return [self._names[idx] for idx, count in ranked if count >= min_overlap and self._names[idx] != name]
+
+    def best(self, name: str, accept: Callable[[str], bool] = lambda _: True) -> Optional[str]:
+        best, best_ratio = None, self.cutoff
+        matcher = difflib.SequenceMatcher(b=name)
+        for candidate in self.candidates(name):
+            matcher.set_seq1(candidate)
+            if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= best_ratio and (best is None or ratio > best_ratio) and accept(candidate):
+                best, best_ratio = candidate, ratio
+        return best
+
+
+def apply_renames(source: str, renames: Dict[Tuple[int, int], Tuple[str, str]]) -> Tuple[str, Set[Tuple[str, str]]]:
+    """
+    Rename identifiers in a single pass over the affected lines. `renames`
+    maps the (line, byte column) of an ast.Name, which is exactly where its
+    token starts, to (old, new). Each edit is checked against the text at that
+    position, so strings, comments and attributes are never touched and no
+    per-name regex scan of the file is needed.
+    Returns the new source and the (old, new) pairs actually applied.
+    """
+    if not renames:
+        return source, set()
+    lines = source.splitlines(keepends=True)
+    by_line: Dict[int, List[Tuple[int, str, str]]] = defaultdict(list)
+    for (row, byte_col), (old, new) in renames.items():
+        by_line[row].append((byte_col, old, new))
+    applied: Set[Tuple[str, str]] = set()
+    for row, edits in by_line.items():
+        line = lines[row - 1]
+        raw = line.encode("utf-8") if not line.isascii() else None
+        for byte_col, old, new in sorted(edits, reverse=True):
+            col = byte_col if raw is None else len(raw[:byte_col].decode("utf-8", errors="ignore"))
+            end = col + len(old)
+            if line[col:end] != old or (end < len(line) and (line[end].isalnum() or line[end] == "_")):
+                continue
+            line = line[:col] + new + line[end:]
+            applied.add((old, new))
+        lines[row - 1] = line
+    return "".join(lines), applied
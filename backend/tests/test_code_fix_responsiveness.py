@@ -0,0 +1,77 @@
+import asyncio
+import json
+import time
+
+import httpx
+from aiohttp import web
+
+from app.main import app
+from app.services import code_fix_service
+
+
+# The fake model streams for about two seconds; health must answer well within that.
+TOKEN_DELAY = 0.1
+TOKENS = 20
+HEALTH_BUDGET = 0.5
+
+
+async def _start_fake_ollama(started: asyncio.Event):
+    """A slow /api/generate that streams NDJSON chunks like Ollama does."""
+
+    async def generate(request: web.Request) -> web.StreamResponse:
+        await request.json()
+        started.set()
+        resp = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await resp.prepare(request)
+        for i in range(TOKENS):
+            await asyncio.sleep(TOKEN_DELAY)
+            text = "const value = 1;\n" if i == 0 else ""
+            await resp.write((json.dumps({"response": text, "done": False}) + "\n").encode())
+        await resp.write((json.dumps({"response": "", "done": True, "eval_count": TOKENS}) + "\n").encode())
+        await resp.write_eof()
+        return resp
+
+    server = web.Application()
+    server.router.add_post("/api/generate", generate)
+    runner = web.AppRunner(server)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_health_answers_while_code_fix_waits_on_model(monkeypatch):
+    async def scenario():
+        started = asyncio.Event()
+        runner, host = await _start_fake_ollama(started)
+        monkeypatch.setattr(code_fix_service, "OLLAMA_HOST", host)
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+                fix = asyncio.create_task(
+                    client.post(
+                        "/api/codefix",
+                        files={"file": ("slow.js", b"const valeu = 1\n", "text/plain")},
+                        data={"mode": "full"},
+                    )
+                )
+                await asyncio.wait_for(started.wait(), timeout=10)
+
+                t0 = time.perf_counter()
+                health = await client.get("/api/health")
+                elapsed = time.perf_counter() - t0
+                assert health.status_code == 200
+                assert health.json() == {"status": "ok"}
+                assert elapsed < HEALTH_BUDGET
+                assert not fix.done(), "the fake model should still be streaming"
+
+                result = await fix
+                assert result.status_code == 200
+                body = result.json()
+                assert body["source"] == "model"
+                assert body["fixed_code"].strip() == "const value = 1;"
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(scenario())
@@ -0,0 +1,52 @@
+import ast
+
+from app.services.code_fix_service import _flag_units, _resolve_mode
+from app.utils.code_units import partition
+
+CLEAN_MODULE = '''import logging
+
+log = logging.getLogger(__name__)
+
+
+class Base:
+    label = __qualname__
+    origin = __module__
+
+    def __init__(self, size):
+        self.size = size
+
+
+class Child(Base):
+    def __init__(self, size, extra):
+        super().__init__(size)
+        self.extra = extra
+
+    def describe(self):
+        return f"{__class__.__name__}: {self.size + self.extra}"
+
+
+def total(items):
+    return sum(item.size for item in items)
+'''
+
+
+def _flags(source: str):
+    tree = ast.parse(source)
+    return _flag_units(tree, partition(source, tree))
+
+
+def test_clean_module_flags_no_units():
+    assert _flags(CLEAN_MODULE) == {}
+
+
+def test_undefined_name_flags_only_its_unit():
+    source = CLEAN_MODULE + "\n\ndef broken():\n    return totl([])\n"
+    units = partition(source)
+    flags = _flags(source)
+    assert list(flags) == [len(units) - 1]
+    assert "`totl` is undefined" in flags[len(units) - 1][0]
+
+
+def test_units_mode_is_python_only():
+    assert _resolve_mode("units", "a.py", CLEAN_MODULE)[0] == "units"
+    assert _resolve_mode("units", "a.json", '{"a": 1}')[0] == "full"
@@ -0,0 +1,77 @@
+import ast
+
+from app.services.code_fix_service import heuristic_fix
+from app.utils.symbols import SymbolTable, TypoIndex, apply_renames
+
+
+def _undefined(source: str):
+    return set(SymbolTable(ast.parse(source)).undefined())
+
+
+def test_forward_references_and_builtins_resolve():
+    source = "def main():\n    return helper(len([]))\n\ndef helper(n):\n    return n\n"
+    assert _undefined(source) == set()
+
+
+def test_class_body_is_not_visible_from_methods():
+    source = "class A:\n    size = 1\n    def f(self):\n        return size\n"
+    assert _undefined(source) == {"size"}
+
+
+def test_implicit_class_names_are_bound():
+    source = (
+        "class A:\n"
+        "    name = __qualname__\n"
+        "    where = __module__\n"
+        "    def f(self):\n"
+        "        return __class__\n"
+        "    def g(self):\n"
+        "        return [__class__ for _ in range(2)]\n"
+    )
+    assert _undefined(source) == set()
+
+
+def test_implicit_class_names_stay_in_their_scope():
+    source = "name = __qualname__\n\nclass A:\n    cls = __class__\n\ndef f():\n    return __module__\n"
+    assert _undefined(source) == {"__qualname__", "__class__", "__module__"}
+
+
+def test_rename_targets_exclude_dunders_and_keywords():
+    targets = SymbolTable(ast.parse("class A:\n    pass\n")).rename_targets()
+    assert "A" in targets and "len" in targets
+    assert not {"__class__", "__build_class__", "__qualname__", "__name__", "True", "None"} & targets
+
+
+def test_apply_renames_edits_only_the_given_name_tokens():
+    source = "x = valeu  # valeu\ns = 'valeu'\ny = obj.valeu + valeu\n"
+    renames = {(1, 4): ("valeu", "value"), (3, 16): ("valeu", "value")}
+    out, applied = apply_renames(source, renames)
+    assert out == "x = value  # valeu\ns = 'valeu'\ny = obj.valeu + value\n"
+    assert applied == {("valeu", "value")}
+
+
+def test_apply_renames_skips_stale_positions():
+    out, applied = apply_renames("x = other\n", {(1, 4): ("valeu", "value")})
+    assert out == "x = other\n" and applied == set()
+
+
+def test_typo_index_best_respects_cutoff():
+    index = TypoIndex(["value", "values", "total"], cutoff=0.8)
+    assert index.best("valeu") == "value"
+    assert index.best("zzz") is None
+
+
+def test_heuristic_fix_renames_typos_to_visible_names():
+    result = heuristic_fix("a.py", "def f(value):\n    return valeu\n")
+    assert "return value" in result["fixed_code"]
+
+
+def test_heuristic_fix_keeps_implicit_class_names():
+    source = "class A:\n    x = __qualname__\n    def f(self):\n        return __class__\n"
+    assert heuristic_fix("a.py", source)["fixed_code"] == source
+
+
+def test_heuristic_fix_never_suggests_dunders():
+    result = heuristic_fix("a.py", "x = __nmae__\ny = __clas__\n")
+    assert "__name__" not in result["fixed_code"]
+    assert "__class__" not in result["fixed_code"]